@@ -23,16 +23,27 @@ bl_info = {
 }
 
 import bpy
-from bpy.props import (BoolProperty, StringProperty, IntProperty, FloatProperty, PointerProperty)
+from bpy.app.handlers import persistent
+from bpy.props import (BoolProperty, StringProperty, IntProperty, FloatProperty, EnumProperty, PointerProperty)
 from bpy.types import (Panel, Operator, PropertyGroup)
-import bmesh
 import random
-from mathutils import Vector
+import functools
+import numpy as np
+from .rs_engine import (CutSettings, FractureJob, BoxFractureJob, Profile, split_faces, split_faces_by_angle, island_chunks,
+    make_planes, boxes_from_piece, Stream, seed_key, named_key, ParallelFractureJob, ResultCache, CachedJob, cache_key, VoronoiJob,
+    open_writer, packed_chunks, packed_origins, take_pieces, shape_groups, slice_piece)
+from .cutter import piece_from_object, surface_names
+from .output import emit_pieces, emit_islands, emit_shared, set_piece_weights
 
 
+#Most faces cut together in one piece on the first level
+CHUNK_FACES = 1000
+
 class RandomShapeProps(PropertyGroup):
     vary_height : BoolProperty(name = "Vary Layer Height", description = "If checked: Use uniform thickness and all objects are the same height. \nIf unchecked: Random thickness is used between min and max values.", default = True)
     make_cubes : BoolProperty(name = "Make Only Cubes", description = "If checked: Only squares and rectangles are created. \nIf unchecked: Random ngons are created", default = True)
+    use_voronoi : BoolProperty(name = "Voronoi Cells", description = "If checked: The mesh is broken into cells around random points on its surface in one pass. \nIf unchecked: The mesh is cut by planes", default = False)
+    voronoi_cells : IntProperty(name = "Number of Cells", description = "How many cells the surface is broken into", default = 1000, min = 1)
     cuts : IntProperty(name = "Number of Cuts", description = "How cuts should be made", default = 1)
     rec_cuts : IntProperty(name = "Number of Recursive Cuts", description = "How recursive cuts should be made.\nNOTE: This can take a long time with higher values. Be careful.", default = 0)
     rec_chance : IntProperty(name = "Chance of Recursive Cuts", description = "Percent chance of recursive cuts on each piece", default = 100, min = 0, max = 100)
@@ -51,24 +62,32 @@ class RandomShapeProps(PropertyGroup):
     include_y : BoolProperty(name = "Y", description = "Include y axis", default = True)
     include_z : BoolProperty(name = "Z", description = "Include z axis", default = True)
     split_faces: BoolProperty(name = "Split Faces", description = "Separate all faces in this object before cutting", default = True)
-
-#Returns a rendom number within range
-def random_num(dim):
-    return random.uniform(-dim,dim)
-
-#Returns a vector that respects the objects center and dimensions
-def random_vector(object_center, dim):
-    return (random_num(dim[0]) + object_center[0],random_num(dim[1]) + object_center[1],random_num(dim[2]) + object_center[2])
-
-#picks a random axis to cut on
-def pick_axis(axes):
-    num = random.randint(0,len(axes) - 1)
-    if num == 0:#x
-        return axes[0]
-    elif num == 1:#y
-        return axes[1]
-    else:#z
-        return axes[2]
+    split_mode : EnumProperty(name = "Split", description = "Which faces are separated when Split Faces is checked", default = 'FACES',
+        items = [('FACES', "Every Face", "Every face is separated"),
+                 ('COPLANAR', "Flat Regions", "Connected faces that lie in the same plane stay together")])
+    output_mode : EnumProperty(name = "Output", description = "How the generated pieces are added to the scene", default = 'OBJECTS',
+        items = [('OBJECTS', "Objects", "Each piece is its own object"),
+                 ('ISLANDS', "Single Object", "All pieces are islands of one object with piece_index and piece_center attributes")])
+    share_meshes : BoolProperty(name = "Share Meshes", description = "If checked: Pieces with the same shape use one mesh and the finishing modifiers are applied to it once per shape. \nMost useful with Make Only Cubes and uniform thickness", default = False)
+    share_tolerance : FloatProperty(name = "Tolerance", description = "Pieces whose vertices are this close count as the same shape", default = 0.0001, min = 0.000001, precision = 6)
+    export_format : EnumProperty(name = "Export", description = "Write the pieces straight to a file as they are made", default = 'NONE',
+        items = [('NONE', "Don't Export", "Pieces are only added to the scene"),
+                 ('PLY', "Binary PLY", "One PLY file, every vertex has its piece index. Piece origins and Solidify thickness are a piece element"),
+                 ('GLB', "glTF Binary", "One .glb file with a node per piece placed at the piece origin, Solidify thickness is in the node extras"),
+                 ('NPY', "NumPy Arrays", "A .npy file for vertices, loops, face sizes, counts, origins and Solidify thickness")])
+    export_path : StringProperty(name = "Export File", description = "File the pieces are written to. NumPy arrays are written next to it with the array name added", default = "//pieces", subtype = 'FILE_PATH')
+    export_only : BoolProperty(name = "Export Only", description = "If checked: Pieces are written to the file as they are finished and the selected object is left as it was. \nIf unchecked: Pieces are also added to the scene", default = False)
+    max_pieces : IntProperty(name = "Max Pieces", description = "Stop cutting once this many pieces exist. 0 for no limit", default = 100000, min = 0)
+    max_time : FloatProperty(name = "Max Seconds", description = "Stop cutting after this many seconds. 0 for no limit", default = 300, min = 0)
+    workers : IntProperty(name = "Worker Processes", description = "Cut in this many processes at once, Blender 2.93 and later. 1 cuts inside Blender. \nThe same seed gives the same shapes for any number", default = 1, min = 1, max = 256)
+    report_timings : BoolProperty(name = "Report Timings", description = "Show how long each phase took after generating", default = True)
+    timings_path : StringProperty(name = "Timings File", description = "If set: Timings for every phase and recursion level are written to this JSON file", default = "", subtype = 'FILE_PATH')
+    use_cache : BoolProperty(name = "Cache Results", description = "If checked: Results are saved to disk and read back when the same mesh is cut with the same settings and seed", default = False)
+    cache_dir : StringProperty(name = "Cache Folder", description = "Folder the results are saved in. The system temp folder is used if empty", default = "", subtype = 'DIR_PATH')
+    cache_size : IntProperty(name = "Cache Size (MB)", description = "The least recently used results are removed once the cache is bigger than this", default = 1024, min = 1)
+    use_seed : BoolProperty(name = "Use Seed", description = "If checked: The same seed and settings always make the same shapes. \nIf unchecked: A new seed is picked every time", default = False)
+    seed : IntProperty(name = "Seed", description = "Seed for all random cuts and thickness", default = 0, min = 0)
+    keep_partial : BoolProperty(name = "Keep Partial Result", description = "If checked: Pieces cut so far are kept when cancelling. \nIf unchecked: The selected object is left as it was", default = True)
 
 #Sets up axes list to contain user selected axes
 def axis_setup():
@@ -84,159 +103,488 @@ def axis_setup():
         return -1
     return tmp_list
 
-#Main Operator
-def generate_shapes(self, context):
+#Settings that change the cut pieces other than rec_cuts. Shapes cut with different ones can't be updated, only cut again
+def cut_signature(rand_shape_props, seed, axes):
+    return (seed, rand_shape_props.make_cubes, rand_shape_props.cuts, rand_shape_props.rec_chance, tuple(axes),
+        rand_shape_props.split_faces, rand_shape_props.split_mode, rand_shape_props.use_voronoi, rand_shape_props.voronoi_cells)
+
+#The shapes made by one run and everything needed to change them without cutting again: the mesh as read, the job
+#with the pieces of every level it finished, the settings it was cut with, and the objects it made and the collection
+#they were made in. The objects are kept by name from the moment they are made, nothing is read back from the selection.
+#While cutting it also holds the export file the pieces are written to. Materials and UV layers of the mesh are kept
+#by name and given to every piece
+class ShapesRun:
+    def __init__(self, source, seed, signature, rec_cuts, job, name, collection_name, surface_names):
+        self.source = source
+        self.material_names, self.uv_names = surface_names
+        self.seed = seed
+        self.signature = signature
+        self.rec_cuts = rec_cuts
+        self.job = job
+        self.name = name
+        self.collection_name = collection_name
+        self.packed = None
+        self.object_names = []
+        self.pieces_collection_name = collection_name
+        self.output_mode = None
+        self.shared = False
+        self.writer = None
+        self.export_stream = None
+
+    #The objects made, or None if any of them was removed
+    def objects(self):
+        objects = [bpy.data.objects.get(name) for name in self.object_names]
+        if not objects or None in objects:
+            return None
+        return objects
+
+    #(materials, uv layer names) for output.set_surface, materials that were removed leave their slot empty
+    def surface(self):
+        return [bpy.data.materials.get(name) if name else None for name in self.material_names], self.uv_names
+
+    #The collection the selected object was in, the scene collection if it is gone
+    def collection(self, context):
+        return bpy.data.collections.get(self.collection_name) or context.scene.collection
+
+    #The collection the objects were made in
+    def pieces_collection(self, context):
+        return bpy.data.collections.get(self.pieces_collection_name) or context.scene.collection
+
+    #The collection new objects go in: the named collection when Add Objects to Collection is checked, made if it
+    #does not exist yet, otherwise the collection the selected object was in
+    def target_collection(self, context):
+        rand_shape_props = bpy.context.scene.rand_shape_prop
+        if not rand_shape_props.use_collection_bool:
+            return self.collection(context)
+        col = bpy.data.collections.get(rand_shape_props.collection_name)
+        if col is None:
+            col = bpy.data.collections.new(rand_shape_props.collection_name)
+            context.scene.collection.children.link(col)
+        return col
+
+#The last shapes made in this session, used by Update Shapes
+last_run = None
+
+#The last shapes belong to the file they were made in, opening another file forgets them
+@persistent
+def clear_last_run(dummy):
+    global last_run
+    last_run = None
+
+#Checks the selection and settings and sets up the cutting job. Returns (obj, run, cached) or None if nothing can be cut.
+#cached is the cache and key a finished result is saved under, or None
+def start_shapes(self, context):
+    #get props
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    seed = rand_shape_props.seed if rand_shape_props.use_seed else random.getrandbits(31)
+
+    #No object selected when cutting
+    if bpy.context.active_object == None:
+        self.report({'WARNING'}, 'Please select an object.')
+        return None
+
+    obj = bpy.context.active_object
+    if obj.type != 'MESH':
+        self.report({'WARNING'}, 'Please select a mesh object.')
+        return None
+
+    axes = axis_setup()
+
+    #no axis selected in panel
+    if axes == -1:
+        self.report({'WARNING'}, 'Please include atleast one axis to cut on')
+        return None
+
+    profile = Profile()
+    profile.seed = seed
+
+    #Read the mesh once and cut it in memory
+    with profile.phase("read"):
+        source = piece_from_object(obj)
+    profile.count("read", 1, len(source.verts))
+    #Pieces only written to the export file are never all held at once, so the job keeps no levels and nothing is cached
+    export_only = rand_shape_props.export_format != 'NONE' and rand_shape_props.export_only
+    job, cached = make_job(self, source, seed, axes, profile, not export_only)
+    if export_only:
+        cached = None
+    run = ShapesRun(source, seed, cut_signature(rand_shape_props, seed, axes), rand_shape_props.rec_cuts, job,
+        obj.name, obj.users_collection[0].name, surface_names(obj))
+    if rand_shape_props.export_format != 'NONE':
+        start_export(self, run)
+    return obj, run, cached
+
+#Sets up the cutting job for a mesh read with piece_from_object, or a job holding a cached result. Returns (job, cached).
+#With keep_levels the job keeps the pieces of every level so Update Shapes can change rec_cuts without cutting again
+def make_job(self, source, seed, axes, profile, keep_levels=True):
     #get props
     rand_shape_props = bpy.context.scene.rand_shape_prop
     cubes = rand_shape_props.make_cubes
-    vary_layer_height = rand_shape_props.vary_height
     number_of_cuts = rand_shape_props.cuts
     num_of_rec = rand_shape_props.rec_cuts
     chance_of_rec = rand_shape_props.rec_chance
+    face_sep = rand_shape_props.split_faces
+    split_mode = rand_shape_props.split_mode
+    max_pieces = rand_shape_props.max_pieces
+    max_time = rand_shape_props.max_time
+    workers = rand_shape_props.workers
+    voronoi = rand_shape_props.use_voronoi
+    cells = rand_shape_props.voronoi_cells
+
+    #Same mesh, settings and seed as a saved result, the pieces are read back instead of cut
+    cached = None
+    if rand_shape_props.use_cache:
+        cache = ResultCache(bpy.path.abspath(rand_shape_props.cache_dir), rand_shape_props.cache_size * 1024 * 1024)
+        key = cache_key(source, (seed, cubes, number_of_cuts, num_of_rec, chance_of_rec, tuple(axes), face_sep, split_mode, voronoi, cells))
+        with profile.phase("cache read"):
+            packed = cache.get(key)
+        if packed is not None:
+            return CachedJob(packed, profile), None
+        cached = (cache, key)
+
+    #Cells are clipped from the faces as they are, there are no planes or levels
+    if voronoi:
+        return VoronoiJob(source, cells, seed_key(seed), max_pieces, max_time, profile), cached
+
+    #Every piece gets its own random stream made from its parent's, starting from the seed
+    source.stream = Stream(seed_key(seed))
+    #Split faces gives every face its own vertices so they come apart on the first cut
+    if face_sep:
+        with profile.phase("split faces"):
+            if split_mode == 'COPLANAR':
+                source = split_faces_by_angle(source)
+            else:
+                source = split_faces(source)
+        profile.count("split faces", len(source.faces), len(source.verts))
+
+    settings = CutSettings(cubes, number_of_cuts, num_of_rec, chance_of_rec, axes)
+    #Boxes cut on 90 degree angles stay boxes so they can be cut as bounds only
+    boxes = None
+    if cubes:
+        with profile.phase("find boxes"):
+            boxes = boxes_from_piece(source)
+    if boxes is not None:
+        job = BoxFractureJob(boxes[0], boxes[1], settings, source.center(), source.dimensions(), seed_key(seed), max_pieces, max_time, profile, keep_levels,
+            originals=boxes[2])
+    else:
+        #The first cuts are the same for the whole mesh, so its loose parts can be cut a chunk at a time
+        first_planes = make_planes(source, settings, source.stream)
+        with profile.phase("chunks"):
+            chunks = island_chunks(source, CHUNK_FACES)
+        profile.count("chunks", len(chunks), len(source.verts))
+        #Both jobs cut with slice_piece, so the number of workers never changes the shapes
+        if workers > 1:
+            #Chunks and the pieces cut from them are cut in worker processes that don't have bpy
+            job = ParallelFractureJob(chunks, settings, first_planes, workers, max_pieces, max_time, profile, keep_levels)
+        else:
+            job = FractureJob(chunks, settings, functools.partial(slice_piece, profile=profile), max_pieces, max_time, profile, first_planes, keep_levels=keep_levels)
+    return job, cached
+
+#Saves a finished result in the cache. Results cut short by a limit are not saved
+def cache_result(self, job, cached, packed):
+    if cached is None or job.stopped:
+        return
+    cache, key = cached
+    with job.profile.phase("cache write"):
+        try:
+            cache.put(key, packed)
+        except OSError as error:
+            self.report({'WARNING'}, 'Could not save to the cache: %s' % error)
+
+#Replaces the selected object with the cut pieces, then adds finishing settings and collections
+def finish_shapes(self, context, obj, run, packed):
+    global last_run
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    #The pieces are packed, the job only keeps its levels for Update Shapes
+    run.job.release()
+    if rand_shape_props.export_format != 'NONE':
+        exported = finish_export(self, run, packed)
+        if rand_shape_props.export_only:
+            report_timings(self, run.job.profile, exported)
+            return
+    #The pieces replace the selected object
+    remove_objects([obj])
+    emit_shapes(self, context, run, packed, run.job.profile)
+    last_run = run
+
+#Most pieces written to the export file at once
+EXPORT_CHUNK = 1000
+
+#Opens the export file for a run. With Export Only the job hands its finished pieces straight to the file and drops
+#them, so memory does not grow with the piece count. Otherwise the pieces are written when the job is done
+def start_export(self, run):
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    #Thickness is drawn piece by piece in order, the same as the objects get it
+    run.export_stream = Stream(named_key(run.seed, "solidify"))
+    try:
+        run.writer = open_writer(rand_shape_props.export_format, bpy.path.abspath(rand_shape_props.export_path))
+    except OSError as error:
+        self.report({'WARNING'}, 'Could not export the pieces: %s' % error)
+        return
+    if rand_shape_props.export_only:
+        run.job.stream_to(functools.partial(export_pieces, self, run), EXPORT_CHUNK)
+
+#Writes pieces to the export file with their Solidify thickness. If writing fails the file is dropped and cutting stops
+def export_pieces(self, run, packed):
+    if run.writer is None:
+        return
+    profile = run.job.profile
+    with profile.phase("export"):
+        try:
+            run.writer.add(packed, piece_thickness(len(packed.vert_counts), run.export_stream))
+        except OSError as error:
+            self.report({'WARNING'}, 'Could not export the pieces: %s' % error)
+            discard_export(run)
+            run.job.cancel()
+    profile.count("export", len(packed.vert_counts), len(packed.verts))
+
+#Writes the pieces the job still holds and closes the export file. Returns how many pieces were written
+def finish_export(self, run, packed):
+    for chunk in packed_chunks(packed, EXPORT_CHUNK):
+        export_pieces(self, run, chunk)
+    if run.writer is None:
+        return 0
+    writer = run.writer
+    run.writer = None
+    with run.job.profile.phase("export"):
+        try:
+            writer.close()
+        except OSError as error:
+            self.report({'WARNING'}, 'Could not export the pieces: %s' % error)
+            writer.discard()
+            return 0
+    return writer.piece_total
+
+#Drops the export file of a run that is not finished
+def discard_export(run):
+    if run.writer is not None:
+        run.writer.discard()
+        run.writer = None
+
+#Removes objects and their meshes if nothing else uses them
+def remove_objects(objects):
+    for ob in objects:
+        mesh = ob.data
+        bpy.data.objects.remove(ob)
+        if mesh.users == 0:
+            bpy.data.meshes.remove(mesh)
+
+#Adds the pieces to the scene with finishing settings and collections, and keeps them on the run
+def emit_shapes(self, context, run, packed, profile):
+    #get props
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    output_mode = rand_shape_props.output_mode
+    shared = rand_shape_props.share_meshes and output_mode == 'OBJECTS'
+
+    #Pieces are made straight in the collection they belong in, so they are never moved afterwards
+    with profile.phase("collections"):
+        col = run.target_collection(context)
+    with profile.phase("emit"):
+        if output_mode == 'ISLANDS':
+            objects_to_cut = [emit_islands(packed, run.name, col, np.array(run.source.center()), run.surface())]
+        elif shared:
+            objects_to_cut = emit_shared_shapes(context, run, packed, col, profile)
+        else:
+            objects_to_cut = emit_pieces(packed, run.name, col, run.surface())
+    profile.count("emit", len(packed.vert_counts), len(packed.verts))
+
+    #Finishing settings, shared meshes have them applied already
+    if not shared:
+        with profile.phase("finishing"):
+            add_finishing(objects_to_cut, packed, Stream(named_key(run.seed, "solidify")))
+
+    run.packed = packed
+    run.object_names = [ob.name for ob in objects_to_cut]
+    run.pieces_collection_name = col.name
+    run.output_mode = output_mode
+    run.shared = shared
+    report_timings(self, profile, len(packed.vert_counts))
+
+#Makes one mesh for every group of pieces with the same shape and thickness, then an object for every piece using
+#its group's mesh. The finishing modifiers are applied to the shared meshes, so they are worked out once per shape
+def emit_shared_shapes(context, run, packed, collection, profile):
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    thickness = piece_thickness(len(packed.vert_counts), Stream(named_key(run.seed, "solidify")))
+    with profile.phase("share"):
+        first, groups = shape_groups(packed, rand_shape_props.share_tolerance, thickness)
+    profile.count("share", len(first), 0)
+
+    shape_packed = take_pieces(packed, first)
+    shapes = emit_pieces(shape_packed, run.name, collection, run.surface())
+    if rand_shape_props.use_solidify_bool or rand_shape_props.use_bevel_bool or rand_shape_props.use_subd_bool:
+        add_finishing(shapes, shape_packed, None, thickness[first])
+        depsgraph = context.evaluated_depsgraph_get()
+        meshes = [bpy.data.meshes.new_from_object(ob.evaluated_get(depsgraph)) for ob in shapes]
+        remove_objects(shapes)
+    else:
+        meshes = [ob.data for ob in shapes]
+        for ob in shapes:
+            bpy.data.objects.remove(ob)
+    return emit_shared(meshes, groups, packed_origins(packed), run.name, collection)
+
+#Solidify thickness of every piece as add_finishing sets it, 0 without Solidify
+def piece_thickness(count, stream):
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    if not rand_shape_props.use_solidify_bool:
+        return np.zeros(count)
+    if not rand_shape_props.vary_height:
+        return np.full(count, rand_shape_props.solidify_thickness)
+    if rand_shape_props.output_mode == 'ISLANDS':
+        return -np.array([stream.uniform(rand_shape_props.solidify_thickness_min, rand_shape_props.solidify_thickness_max) for i in range(count)])
+    return np.array([stream.uniform(-rand_shape_props.solidify_thickness_max, -rand_shape_props.solidify_thickness_min) for i in range(count)])
+
+#Finishing modifiers in stack order
+FINISHING_MODIFIERS = (("Solidify", 'SOLIDIFY'), ("Bevel", 'BEVEL'), ("Subdivision Surface", 'SUBSURF'))
+
+#Adds the Solidify, Bevel and Subdivision Surface modifiers from the finishing settings.
+#Modifiers added before are changed in place, so this also updates shapes made earlier.
+#thickness is the Solidify thickness of every object, drawn from stream when not given
+def add_finishing(objects_to_cut, packed, stream, thickness=None):
+    #get props
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    vary_layer_height = rand_shape_props.vary_height
     use_solidify = rand_shape_props.use_solidify_bool
     solidify_mod_thickness = rand_shape_props.solidify_thickness
-    solidify_thickness_min = rand_shape_props.solidify_thickness_min
     solidify_thickness_max = rand_shape_props.solidify_thickness_max
     use_bevel = rand_shape_props.use_bevel_bool
     bev_width = rand_shape_props.bevel_width_float
     bevel_seg = rand_shape_props.bevel_seg_int
     use_subd = rand_shape_props.use_subd_bool
     sub_d_lev = rand_shape_props.sub_d_levels
-    use_col = rand_shape_props.use_collection_bool
-    col_name = rand_shape_props.collection_name
-    face_sep = rand_shape_props.split_faces
+    output_mode = rand_shape_props.output_mode
+
+    if thickness is None and use_solidify and vary_layer_height:
+        thickness = piece_thickness(len(packed.vert_counts), stream)
+    wanted = [name for name, use in zip([name for name, kind in FINISHING_MODIFIERS], (use_solidify, use_bevel, use_subd)) if use]
+    for i, obj in enumerate(objects_to_cut):
+        #The modifiers are made again when some are turned on or off so they stay in order
+        existing = [mod.name for mod in obj.modifiers if mod.name in dict(FINISHING_MODIFIERS)]
+        if existing != wanted:
+            for name in existing:
+                obj.modifiers.remove(obj.modifiers[name])
+            for name, kind in FINISHING_MODIFIERS:
+                if name in wanted:
+                    obj.modifiers.new(name=name, type=kind)
+        if use_solidify:
+            solidify_mod = obj.modifiers["Solidify"]
+            solidify_mod.vertex_group = ""
+            if vary_layer_height and output_mode == 'ISLANDS':
+                #One modifier for all pieces, each piece's thickness is a vertex group weight of the max thickness
+                weights = [-t / solidify_thickness_max if solidify_thickness_max else 1.0 for t in thickness.tolist()]
+                set_piece_weights(obj, packed, weights, "Thickness")
+                solidify_mod.thickness = -solidify_thickness_max
+                solidify_mod.vertex_group = "Thickness"
+            elif vary_layer_height:
+                solidify_mod.thickness = thickness[i]
+            else:
+                solidify_mod.thickness = solidify_mod_thickness
+        if use_bevel:
+            bevel_mod = obj.modifiers["Bevel"]
+            bevel_mod.width = bev_width
+            bevel_mod.segments = bevel_seg
+            bevel_mod.limit_method = 'ANGLE'
+        if use_subd:
+            subd_mod = obj.modifiers["Subdivision Surface"]
+            subd_mod.levels = sub_d_lev
+
+#Shows the timings in the operator report and writes them to the timings file if one is set
+def report_timings(self, profile, piece_count):
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    if rand_shape_props.report_timings:
+        self.report({'INFO'}, 'Random Shapes: %d pieces with seed %d in %s' % (piece_count, profile.seed, profile.summary()))
+    if rand_shape_props.timings_path:
+        profile.write_json(bpy.path.abspath(rand_shape_props.timings_path))
 
-    #get version num for modifier apply
-    version = bpy.app.version
-    
-    #No object selected when cutting
-    if bpy.context.active_object == None:
-        self.report({'WARNING'}, 'Please select an object.')
-        return {'FINISHED'}
+#Warns when a cutting job stopped before all cuts were made
+def report_stopped(self, job):
+    if job.stopped:
+        self.report({'WARNING'}, 'Stopped cutting early: %s. Kept %d pieces.' % (job.stopped, job.piece_count))
 
-    obj = bpy.context.active_object
-    objects_to_cut = []
+#Main Operator
+def generate_shapes(self, context):
+    started = start_shapes(self, context)
+    if started is None:
+        return
+    obj, run, cached = started
+    run.job.run()
+    report_stopped(self, run.job)
+    packed = run.job.packed()
+    cache_result(self, run.job, cached, packed)
+    finish_shapes(self, context, obj, run, packed)
+
+#Changes the last shapes made to the current settings. Finishing and collection changes are made on the objects,
+#a different rec_cuts uses a kept level or cuts only the pieces of the deepest one. Other cut settings cut the kept mesh again
+def update_shapes(self, context):
+    run = last_run
+    if run is None:
+        self.report({'WARNING'}, 'Generate shapes first. Only shapes made since this file was opened can be updated.')
+        return
+    objects = run.objects()
+    if objects is None:
+        self.report({'WARNING'}, 'Some of the last generated shapes were removed. Generate them again.')
+        return
 
-    #Splits all the faces of the selected object and adds them to cut list
-    if face_sep:
-        edge_mod = obj.modifiers.new(name="Edge Split", type='EDGE_SPLIT')
-        edge_mod.split_angle = 0
-        if version >= (2, 90, 0):
-            bpy.ops.object.modifier_apply()
-        else:
-            bpy.ops.object.modifier_apply(apply_as='DATA', modifier="Edge Split")
-        objects_to_cut.extend(bpy.context.selected_objects)
-    else:
-        objects_to_cut.append(obj)
-    
-    new_objects = []
-    cutting = True
+    rand_shape_props = bpy.context.scene.rand_shape_prop
+    num_of_rec = rand_shape_props.rec_cuts
     axes = axis_setup()
-
-    #no axis selected in panel
     if axes == -1:
         self.report({'WARNING'}, 'Please include atleast one axis to cut on')
-        return {'FINISHED'}
-
-    #Number of recursions defaults to zero meaning no recursion. Add one to make sure we cut selected object atleast once
-    for r in range(num_of_rec + 1):
-        for ob in objects_to_cut:
-            if r > 0: #First loop always cuts otherwise determine if recursive cuts happen
-                num = random.randint(0, 100)
-                if num in range(0, chance_of_rec):
-                    cutting = True
-                else:
-                    cutting = False
-
-            location = ob.location
-
-            #get dimension - 10 percent to cut each piece
-            #used in random_num and rand_vector to give random cut values within dimensions of current object
-            dim = []
-            for value in ob.dimensions:
-                tmp = (value / 2) - ((value / 2) * .1)
-                dim.append(tmp)
-            
-            #Select, shade smooth and enter editmode for cutting
-            bpy.ops.object.select_all(action='DESELECT')
-            bpy.data.objects[ob.name].select_set(True)
-            bpy.ops.object.shade_smooth()
-            bpy.ops.object.editmode_toggle()
-
-            if cutting:
-                for i in range(number_of_cuts):
-                    bpy.ops.mesh.select_all(action='SELECT')
-                    if cubes: #Creates cuts only at 90 degree angles
-                        axis = pick_axis(axes)#Get a random axis to cut along
-                        if axis == "x":
-                            bpy.ops.mesh.bisect(plane_co=(location[0],random_num(dim[1]) + location[1],0), plane_no=(0, 1, 0))
-                        elif axis == "y":
-                            bpy.ops.mesh.bisect(plane_co=(random_num(dim[0]) + location[0],location[1],0), plane_no=(1, 0, 0))
-                        elif axis == "z":
-                            bpy.ops.mesh.bisect(plane_co=(location[0],location[1],random_num(dim[2]) + location[2]), plane_no=(0, 0, 1))
-                    else: #Creates random cuts at any angle
-                        bpy.ops.mesh.bisect(plane_co=random_vector(location,dim), plane_no=random_vector((0,0,0), dim))
-                    bpy.ops.mesh.edge_split()
-                bpy.ops.mesh.select_all(action='DESELECT')
-                bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='EDGE')
-                bpy.ops.mesh.separate(type='LOOSE')
-                bpy.ops.object.editmode_toggle()
-                bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='MEDIAN')
-
-                #Add all created objects to new list
-                new_objects.extend(bpy.context.selected_objects)
+        return
+    #Without Use Seed the shapes keep the seed they were made with
+    seed = rand_shape_props.seed if rand_shape_props.use_seed else run.seed
+    profile = Profile()
+    profile.seed = seed
+
+    job = run.job
+    packed = run.packed
+    kept = job.kept_levels
+    if cut_signature(rand_shape_props, seed, axes) != run.signature:
+        job, cached = make_job(self, run.source, seed, axes, profile)
+        job.run()
+        packed = job.packed()
+        cache_result(self, job, cached, packed)
+        run.seed = seed
+        run.signature = cut_signature(rand_shape_props, seed, axes)
+    elif num_of_rec != run.rec_cuts and not rand_shape_props.use_voronoi:
+        if kept and num_of_rec in kept:
+            #Going back to a level that was kept
+            packed = job.packed_level(num_of_rec)
+        elif kept and num_of_rec > max(kept):
+            #Only the pieces of the deepest kept level are cut
+            if isinstance(job, FractureJob):
+                job = job.resumed(num_of_rec, profile, functools.partial(slice_piece, profile=profile))
             else:
-                bpy.ops.object.editmode_toggle()
-                new_objects.append(ob)
-        
-        #Clear lists used for this loop and copy in newly created objects
-        objects_to_cut.clear()
-        objects_to_cut = new_objects.copy()
-        new_objects.clear()
-
-    #Finishing settings
-    if use_bevel or use_subd or use_solidify:
-        for obj in objects_to_cut:
-            if use_solidify:
-                solidify_mod = obj.modifiers.new(name="Solidify", type='SOLIDIFY')
-                if vary_layer_height:
-                    solidify_mod.thickness = random.uniform(-solidify_thickness_max, -solidify_thickness_min)
-                else:
-                    solidify_mod.thickness = solidify_mod_thickness
-            if use_bevel:
-                bevel_mod = obj.modifiers.new(name="Bevel", type='BEVEL')
-                bevel_mod.width = bev_width
-                bevel_mod.segments = bevel_seg
-                bevel_mod.limit_method = 'ANGLE'
-            if use_subd:
-                subd_mod = obj.modifiers.new(name="Subdivision Surface", type='SUBSURF')
-                subd_mod.levels = sub_d_lev
-
-    #Adds to new collection and removes from the original collection. If collection name exists it adds to that collection
-    if use_col:
-        col_exists = False
-        for collection in bpy.data.collections:
-            if col_name == collection.name:
-                col_exists = True
-
-        if col_exists:
-            col = bpy.data.collections[col_name]
-            old_col = bpy.data.collections[ob.users_collection[0].name]
-            for ob in objects_to_cut:
-                if ob.name not in col.objects:#check if object is already in this collection
-                    col.objects.link(ob)
-                    old_col.objects.unlink(ob)
+                job = job.resumed(num_of_rec, profile)
+            job.run()
+            packed = job.packed()
         else:
-            col = bpy.data.collections.new(col_name)
-            bpy.context.scene.collection.children.link(col)
-            old_col = bpy.data.collections[ob.users_collection[0].name]
-            for ob in objects_to_cut:
+            job, cached = make_job(self, run.source, seed, axes, profile)
+            job.run()
+            packed = job.packed()
+            cache_result(self, job, cached, packed)
+    report_stopped(self, job)
+    job.release()
+    run.job = job
+    run.rec_cuts = num_of_rec
+
+    #Shared meshes have the finishing applied, so they are made again
+    if packed is not run.packed or rand_shape_props.output_mode != run.output_mode or run.shared or rand_shape_props.share_meshes:
+        remove_objects(objects)
+        emit_shapes(self, context, run, packed, profile)
+        return
+
+    #Same pieces, only the finishing settings and collection are changed
+    with profile.phase("finishing"):
+        add_finishing(objects, packed, Stream(named_key(run.seed, "solidify")))
+    #The objects are only moved when the collection setting changed
+    with profile.phase("collections"):
+        current_col = run.pieces_collection(context)
+        col = run.target_collection(context)
+        if col != current_col:
+            for ob in objects:
                 col.objects.link(ob)
-                old_col.objects.unlink(ob)
-
-    #Clear lists when finished cutting
-    objects_to_cut.clear()
-    axes.clear()
+                current_col.objects.unlink(ob)
+            run.pieces_collection_name = col.name
+    report_timings(self, profile, len(packed.vert_counts))
 
 #operator
 class Random_Shape_OT_Operator(bpy.types.Operator):
@@ -249,6 +597,98 @@ class Random_Shape_OT_Operator(bpy.types.Operator):
         generate_shapes(self, context)
         return{'FINISHED'}
 
+#Changes the last generated shapes to the current settings without cutting them again where it can
+class Random_Shape_OT_Update(bpy.types.Operator):
+    bl_idname = "view3d.random_shape_update"
+    bl_label = "Update Random Shapes"
+    bl_description = "Change the last generated shapes to the current settings. Finishing and recursive cut changes don't cut everything again"
+
+    def execute(self, context):
+        update_shapes(self, context)
+        return{'FINISHED'}
+
+#Cuts a few pieces on every timer tick so Blender stays responsive. Esc cancels
+class Random_Shape_OT_Modal(bpy.types.Operator):
+    bl_idname = "view3d.random_shape_modal"
+    bl_label = "Random Shape (Interactive)"
+    bl_description = "Generate Random Shapes with progress in the status bar. Press Esc to cancel"
+
+    #Seconds of cutting per timer tick
+    time_slice = 0.05
+
+    def invoke(self, context, event):
+        started = start_shapes(self, context)
+        if started is None:
+            return {'CANCELLED'}
+        obj, self.run, self.cached = started
+        #Only the name is kept, the object may be deleted while cutting
+        self.obj_name = obj.name
+        self.job = self.run.job
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.progress_begin(0, 100)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            return self.cancel_shapes(context)
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        done = self.job.step(self.time_slice)
+        context.window_manager.progress_update(int(self.job.progress() * 100))
+        context.workspace.status_text_set("Random Shapes: %d pieces done, %d remaining on level %d. Esc to cancel"
+            % (self.job.pieces_done, self.job.pieces_remaining, self.job.level + 1))
+        if done:
+            self.end(context)
+            obj = self.source_object()
+            if obj is None:
+                discard_export(self.run)
+                return {'CANCELLED'}
+            report_stopped(self, self.job)
+            packed = self.job.packed()
+            cache_result(self, self.job, self.cached, packed)
+            finish_shapes(self, context, obj, self.run, packed)
+            return {'FINISHED'}
+        return {'RUNNING_MODAL'}
+
+    #Keeps the pieces cut so far or leaves the selected object untouched, depending on Keep Partial Result
+    def cancel_shapes(self, context):
+        self.end(context)
+        self.job.cancel()
+        if context.scene.rand_shape_prop.keep_partial:
+            obj = self.source_object()
+            if obj is None:
+                discard_export(self.run)
+                return {'CANCELLED'}
+            self.report({'INFO'}, 'Cancelled. Kept %d pieces.' % self.job.piece_count)
+            finish_shapes(self, context, obj, self.run, self.job.packed())
+            return {'FINISHED'}
+        discard_export(self.run)
+        self.report({'INFO'}, 'Cancelled.')
+        return {'CANCELLED'}
+
+    #Called by Blender when it stops the operator itself, for example when a file is loaded or the window is closed.
+    #Nothing is kept, the workers and the export file are thrown away
+    def cancel(self, context):
+        self.end(context)
+        self.job.cancel()
+        discard_export(self.run)
+
+    #The selected object looked up by name, or None with a warning if it was deleted while cutting
+    def source_object(self):
+        obj = bpy.data.objects.get(self.obj_name)
+        if obj is None:
+            self.report({'WARNING'}, 'The selected object was removed while cutting.')
+        return obj
+
+    def end(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+
 #UI
 class RANDOMSHAPE_PT_Panel(bpy.types.Panel):
     bl_idname = "Random_Shape_PT_Panel"
@@ -265,17 +705,41 @@ class RANDOMSHAPE_PT_Panel(bpy.types.Panel):
         box1 = layout.box()
         box1_col1 = box1.column(align=False)
         box1_col1.prop(scene.rand_shape_prop, "split_faces")
-        box1_col1.prop(scene.rand_shape_prop, "cuts")
-        box1_col1.prop(scene.rand_shape_prop, "rec_cuts")
-        box1_col1.prop(scene.rand_shape_prop, "rec_chance", slider=True)
-        box1_col1.prop(scene.rand_shape_prop, "make_cubes")
+        if scene.rand_shape_prop.split_faces:
+            box1_col1.prop(scene.rand_shape_prop, "split_mode")
+        box1_col1.prop(scene.rand_shape_prop, "use_voronoi")
+        voronoi = scene.rand_shape_prop.use_voronoi
+        if voronoi:
+            box1_col1.prop(scene.rand_shape_prop, "voronoi_cells")
+        else:
+            box1_col1.prop(scene.rand_shape_prop, "cuts")
+            box1_col1.prop(scene.rand_shape_prop, "rec_cuts")
+            box1_col1.prop(scene.rand_shape_prop, "rec_chance", slider=True)
+            box1_col1.prop(scene.rand_shape_prop, "make_cubes")
         cubes = scene.rand_shape_prop.make_cubes
-        if cubes:
+        if cubes and not voronoi:
             box1_col1.label(text="Cut On:")
             box1_col1.prop(scene.rand_shape_prop, "include_x")
             box1_col1.prop(scene.rand_shape_prop, "include_y")
             box1_col1.prop(scene.rand_shape_prop, "include_z")
 
+        box1_col1.prop(scene.rand_shape_prop, "output_mode")
+        if scene.rand_shape_prop.output_mode == 'OBJECTS':
+            box1_row2 = box1_col1.row(align=True)
+            box1_row2.prop(scene.rand_shape_prop, "share_meshes")
+            box1_row2_sub = box1_row2.row(align=True)
+            box1_row2_sub.enabled = scene.rand_shape_prop.share_meshes
+            box1_row2_sub.prop(scene.rand_shape_prop, "share_tolerance")
+        box1_col1.prop(scene.rand_shape_prop, "export_format")
+        if scene.rand_shape_prop.export_format != 'NONE':
+            box1_col1.prop(scene.rand_shape_prop, "export_path")
+            box1_col1.prop(scene.rand_shape_prop, "export_only")
+        box1_row1 = box1_col1.row(align=True)
+        box1_row1.prop(scene.rand_shape_prop, "use_seed")
+        box1_row1_sub = box1_row1.row(align=True)
+        box1_row1_sub.enabled = scene.rand_shape_prop.use_seed
+        box1_row1_sub.prop(scene.rand_shape_prop, "seed")
+
         #Lower section of the panel
         layout.label(text="Finishing Settings:")
         
@@ -335,16 +799,38 @@ class RANDOMSHAPE_PT_Panel(bpy.types.Panel):
         #Operator Button
         col2 = layout.column(align=False)
         col2.separator()
+        col2.prop(scene.rand_shape_prop, "max_pieces")
+        col2.prop(scene.rand_shape_prop, "max_time")
+        col2.prop(scene.rand_shape_prop, "workers")
+        col2.prop(scene.rand_shape_prop, "keep_partial")
+        col2.prop(scene.rand_shape_prop, "report_timings")
+        col2.prop(scene.rand_shape_prop, "timings_path")
+        col2.prop(scene.rand_shape_prop, "use_cache")
+        cache_col = col2.column(align=True)
+        cache_col.enabled = scene.rand_shape_prop.use_cache
+        cache_col.prop(scene.rand_shape_prop, "cache_dir")
+        cache_col.prop(scene.rand_shape_prop, "cache_size")
         col2.operator('view3d.random_shape', text="Generate Random Shapes!")
+        col2.operator('view3d.random_shape_modal', text="Generate Interactively")
+        col2.operator('view3d.random_shape_update', text="Update Shapes")
 
 def register():
     bpy.utils.register_class(Random_Shape_OT_Operator)
+    bpy.utils.register_class(Random_Shape_OT_Modal)
+    bpy.utils.register_class(Random_Shape_OT_Update)
     bpy.utils.register_class(RANDOMSHAPE_PT_Panel)
     bpy.utils.register_class(RandomShapeProps)
     bpy.types.Scene.rand_shape_prop = PointerProperty(type=RandomShapeProps)
+    bpy.app.handlers.load_post.append(clear_last_run)
 
 def unregister():
+    global last_run
+    if clear_last_run in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(clear_last_run)
+    last_run = None
     bpy.utils.unregister_class(Random_Shape_OT_Operator)
+    bpy.utils.unregister_class(Random_Shape_OT_Modal)
+    bpy.utils.unregister_class(Random_Shape_OT_Update)
     bpy.utils.unregister_class(RANDOMSHAPE_PT_Panel)
     bpy.utils.unregister_class(RandomShapeProps)
     del bpy.types.Scene.rand_shape_prop 
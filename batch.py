@@ -0,0 +1,291 @@
+#Fractures many assets without the UI. Run it with Blender in the background:
+#
+#    blender -b --python batch.py -- --preset preset.json --output out [--seeds 1 2] [--variants 3] [--workers 8] inputs...
+#
+#The preset is a JSON object of RandomShapeProps settings, for example {"make_cubes": false, "cuts": 4, "rec_cuts": 2}.
+#Settings not in the preset are the add-on defaults, whatever a .blend input was saved with.
+#An input is a .blend, .obj, .ply, .stl, .fbx, .glb or .gltf file. file.blend:Name cuts only the object Name, otherwise
+#every mesh object in the file is cut. Every input is cut once for every seed and variant, variant v of seed s uses seed
+#s * variants + v so the variants of different seeds never share a seed.
+#
+#Jobs are files in a queue folder. With --workers above 1 that many background Blender processes take jobs from the
+#queue until it is empty. Every job writes result.json with its status, piece counts and timings, and result.blend
+#unless --no-save is given. summary.json lists every job once all of them are finished.
+
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+
+import bpy
+
+#Folder holding the add-on, it is imported from here like the add-on preferences would
+ADDON_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#Blender file formats and the version their importer moved to wm
+MESH_IMPORTERS = {
+    ".obj": ((3, 2, 0), "wm.obj_import", "import_scene.obj"),
+    ".ply": ((4, 0, 0), "wm.ply_import", "import_mesh.ply"),
+    ".stl": ((4, 2, 0), "wm.stl_import", "import_mesh.stl"),
+    ".fbx": (None, "import_scene.fbx", "import_scene.fbx"),
+    ".glb": (None, "import_scene.gltf", "import_scene.gltf"),
+    ".gltf": (None, "import_scene.gltf", "import_scene.gltf"),
+}
+
+
+#Imports the add-on from this checkout and registers it, unless it is already enabled
+def register_addon():
+    if hasattr(bpy.types.Scene, "rand_shape_prop"):
+        return
+    parent = os.path.dirname(ADDON_DIR)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    importlib.import_module(os.path.basename(ADDON_DIR)).register()
+
+#Command line options. Blender passes script arguments after "--"
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description="Fracture many assets with Random Shapes in background Blender")
+    parser.add_argument("inputs", nargs="*", help="Files to cut, file.blend:Name cuts only the object Name")
+    parser.add_argument("--preset", default="", help="JSON file of RandomShapeProps settings")
+    parser.add_argument("--output", default="random_shapes_batch", help="Folder the queue, results and summary are written to")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="Seeds every input is cut with")
+    parser.add_argument("--variants", type=int, default=1, help="Variants of every seed, variant v of seed s uses seed s * variants + v")
+    parser.add_argument("--workers", type=int, default=1, help="Background Blender processes run at once")
+    parser.add_argument("--no-save", action="store_true", help="Only write results and timings, not result.blend")
+    parser.add_argument("--worker", default="", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+#Settings of a preset file, checked against RandomShapeProps so a typo is not silently ignored
+def load_preset(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        settings = json.load(f)
+    names = set(bpy.context.scene.rand_shape_prop.bl_rna.properties.keys()) - {"rna_type"}
+    unknown = sorted(set(settings) - names)
+    if unknown:
+        raise SystemExit("Unknown settings in %s: %s" % (path, ", ".join(unknown)))
+    return settings
+
+#Splits file.blend:Name into the file and the object name
+def split_input(text):
+    path, sep, name = text.partition(".blend:")
+    if sep:
+        return os.path.abspath(path + ".blend"), name
+    return os.path.abspath(text), None
+
+#One job for every input, seed and variant. An input or seed given twice is only cut once
+def make_jobs(inputs, seeds, variants):
+    jobs = []
+    seen = set()
+    for text in inputs:
+        path, object_name = split_input(text)
+        label = re.sub(r"[^A-Za-z0-9_.-]+", "_", os.path.splitext(os.path.basename(path))[0] + ("_" + object_name if object_name else ""))
+        for seed in seeds:
+            for variant in range(variants):
+                variant_seed = seed * variants + variant
+                if (path, object_name, variant_seed) in seen:
+                    continue
+                seen.add((path, object_name, variant_seed))
+                jobs.append({"id": "%04d_%s_seed%d" % (len(jobs), label, variant_seed), "input": path,
+                    "object": object_name, "seed": variant_seed})
+    return jobs
+
+#Writes the batch settings and one file per job to the queue folder. Jobs left over from an earlier batch are removed
+def write_queue(output, settings, jobs, save):
+    for folder in ("queue", "running", "jobs", "logs"):
+        os.makedirs(os.path.join(output, folder), exist_ok=True)
+    for folder in ("queue", "running"):
+        for name in os.listdir(os.path.join(output, folder)):
+            os.remove(os.path.join(output, folder, name))
+    with open(os.path.join(output, "batch.json"), "w") as f:
+        json.dump({"settings": settings, "save": save}, f, indent=2)
+    for job in jobs:
+        with open(os.path.join(output, "queue", job["id"] + ".json"), "w") as f:
+            json.dump(job, f, indent=2)
+
+#Takes the next job off the queue, or returns None when it is empty. Moving the file is atomic, so two workers never
+#get the same job
+def claim_job(output):
+    for name in sorted(os.listdir(os.path.join(output, "queue"))):
+        running = os.path.join(output, "running", name)
+        try:
+            os.rename(os.path.join(output, "queue", name), running)
+        except OSError:#another worker took it
+            continue
+        with open(running) as f:
+            return json.load(f)
+    return None
+
+#Removes every object and mesh so each job starts from an empty scene
+def clear_scene():
+    for ob in list(bpy.data.objects):
+        bpy.data.objects.remove(ob)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+
+#Opens or imports the job's input and returns the names of the mesh objects to cut
+def load_input(job):
+    path = job["input"]
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".blend":
+        bpy.ops.wm.open_mainfile(filepath=path)
+        names = [ob.name for ob in bpy.context.scene.objects if ob.type == 'MESH']
+    elif ext in MESH_IMPORTERS:
+        clear_scene()
+        version, new_op, old_op = MESH_IMPORTERS[ext]
+        op = new_op if version is None or bpy.app.version >= version else old_op
+        before = set(bpy.data.objects)
+        module, name = op.split(".")
+        getattr(getattr(bpy.ops, module), name)(filepath=path)
+        names = [ob.name for ob in bpy.data.objects if ob not in before and ob.type == 'MESH']
+    else:
+        raise ValueError("Can't read %s files" % ext)
+    if job["object"]:
+        if job["object"] not in names:
+            raise ValueError("No mesh object named %s in %s" % (job["object"], path))
+        names = [job["object"]]
+    return names
+
+#Cuts one object with the operator, the same as pressing Generate Random Shapes with it selected
+def cut_object(name, timings_path):
+    ob = bpy.data.objects[name]
+    for other in bpy.context.view_layer.objects.selected:
+        other.select_set(False)
+    bpy.context.view_layer.objects.active = ob
+    ob.select_set(True)
+    bpy.context.scene.rand_shape_prop.timings_path = timings_path
+    if os.path.exists(timings_path):
+        os.remove(timings_path)
+    start = time.perf_counter()
+    bpy.ops.view3d.random_shape()
+    seconds = time.perf_counter() - start
+    if not os.path.exists(timings_path):
+        return {"object": name, "status": "failed", "time": seconds}
+    with open(timings_path) as f:
+        timings = json.load(f)
+    #Pieces that were only exported are counted by the export phase
+    emit = timings["phases"].get("emit") or timings["phases"].get("export", {})
+    return {"object": name, "status": "done", "time": seconds, "pieces": emit.get("pieces", 0),
+        "verts": emit.get("verts", 0), "timings": timings}
+
+#Sets every RandomShapeProps setting to the add-on default, then to the preset. A .blend input brings the settings
+#it was saved with, they must not change how it is cut
+def apply_preset(props, settings):
+    for name in props.bl_rna.properties.keys():
+        if name != "rna_type":
+            props.property_unset(name)
+    for key, value in settings.items():
+        setattr(props, key, value)
+
+#Runs one job and writes its result.json, errors are written to the result instead of stopping the worker
+def run_job(output, batch, job):
+    folder = os.path.join(output, "jobs", job["id"])
+    os.makedirs(folder, exist_ok=True)
+    result = dict(job, status="done", objects=[])
+    start = time.perf_counter()
+    try:
+        names = load_input(job)
+        props = bpy.context.scene.rand_shape_prop
+        apply_preset(props, batch["settings"])
+        props.use_seed = True
+        props.seed = job["seed"]
+        props.report_timings = False
+        for i, name in enumerate(names):
+            result["objects"].append(cut_object(name, os.path.join(folder, "timings_%d.json" % i)))
+        if any(obj["status"] != "done" for obj in result["objects"]):
+            result["status"] = "failed"
+        if batch["save"]:
+            bpy.ops.wm.save_as_mainfile(filepath=os.path.join(folder, "result.blend"), copy=True)
+    except Exception:
+        result["status"] = "error"
+        result["error"] = traceback.format_exc()
+    result["time"] = time.perf_counter() - start
+    result["pieces"] = sum(obj.get("pieces", 0) for obj in result["objects"])
+    with open(os.path.join(folder, "result.json"), "w") as f:
+        json.dump(result, f, indent=2)
+    os.remove(os.path.join(output, "running", job["id"] + ".json"))
+    print("%s: %s, %d pieces in %.2fs" % (job["id"], result["status"], result["pieces"], result["time"]))
+
+#Takes jobs off the queue until it is empty
+def work(output):
+    with open(os.path.join(output, "batch.json")) as f:
+        batch = json.load(f)
+    while True:
+        job = claim_job(output)
+        if job is None:
+            break
+        run_job(output, batch, job)
+
+#Starts background Blender workers on the queue and waits for them. Jobs a worker was running when it crashed are
+#written as crashed
+def run_workers(output, workers):
+    command = [bpy.app.binary_path, "-b", "--factory-startup", "--python", os.path.abspath(__file__), "--", "--worker", output]
+    processes = []
+    for i in range(workers):
+        log = open(os.path.join(output, "logs", "worker%d.log" % i), "w")
+        processes.append((subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT), log))
+    for process, log in processes:
+        process.wait()
+        log.close()
+    for name in os.listdir(os.path.join(output, "running")):
+        with open(os.path.join(output, "running", name)) as f:
+            job = json.load(f)
+        folder = os.path.join(output, "jobs", job["id"])
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "result.json"), "w") as f:
+            json.dump(dict(job, status="crashed", objects=[], pieces=0), f, indent=2)
+        os.remove(os.path.join(output, "running", name))
+
+#Joins the result of every job into summary.json
+def write_summary(output, jobs, seconds):
+    results = []
+    for job in jobs:
+        path = os.path.join(output, "jobs", job["id"], "result.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                result = json.load(f)
+            for obj in result["objects"]:
+                obj.pop("timings", None)
+            results.append(result)
+        else:
+            results.append(dict(job, status="not run"))
+    counts = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    with open(os.path.join(output, "summary.json"), "w") as f:
+        json.dump({"time": seconds, "statuses": counts, "jobs": results}, f, indent=2)
+    return counts
+
+def main():
+    args = parse_args()
+    register_addon()
+    if args.worker:
+        work(args.worker)
+        return 0
+    output = os.path.abspath(args.output)
+    settings = load_preset(args.preset)
+    jobs = make_jobs(args.inputs, args.seeds, args.variants)
+    if not jobs:
+        print("Nothing to cut, give at least one input")
+        return 1
+    start = time.perf_counter()
+    write_queue(output, settings, jobs, not args.no_save)
+    if args.workers > 1:
+        run_workers(output, min(args.workers, len(jobs)))
+    else:
+        work(output)
+    counts = write_summary(output, jobs, time.perf_counter() - start)
+    print("Random Shapes batch: %s. Summary in %s" % (", ".join("%d %s" % (n, s) for s, n in sorted(counts.items())),
+        os.path.join(output, "summary.json")))
+    return 0 if counts.get("done", 0) == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
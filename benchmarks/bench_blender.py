@@ -0,0 +1,106 @@
+#Benchmarks the add-on inside background Blender by running view3d.random_shape over a matrix of settings.
+#
+#    blender -b --factory-startup --python benchmarks/bench_blender.py -- [--quick] [--save-baseline]
+#
+#Exits with 1 when a case is slower than the baseline allows.
+
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+
+SEED = 1
+MAX_PIECES = 200000
+MAX_TIME = 120
+
+#Imports the add-on from this checkout and registers it like the add-on preferences would
+def register_addon():
+    parent = os.path.dirname(common.ADDON_DIR)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    addon = importlib.import_module(os.path.basename(common.ADDON_DIR))
+    addon.register()
+    return addon
+
+#Removes every object and mesh so each case starts from the same empty scene
+def clear_scene():
+    for ob in list(bpy.data.objects):
+        bpy.data.objects.remove(ob)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+
+#Adds the input mesh and makes it the active object
+def add_input(name, verts, faces):
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(verts.tolist(), [], faces.tolist())
+    mesh.update()
+    ob = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(ob)
+    bpy.context.view_layer.objects.active = ob
+    ob.select_set(True)
+    return ob
+
+def set_props(cubes, cuts, rec_cuts, split, timings_path):
+    props = bpy.context.scene.rand_shape_prop
+    props.make_cubes = cubes
+    props.cuts = cuts
+    props.rec_cuts = rec_cuts
+    props.rec_chance = 100
+    props.split_faces = split
+    props.include_x = props.include_y = props.include_z = True
+    props.output_mode = 'OBJECTS'
+    props.max_pieces = MAX_PIECES
+    props.max_time = MAX_TIME
+    props.report_timings = False
+    props.timings_path = timings_path
+    props.use_seed = True
+    props.seed = SEED
+
+def run(args):
+    results = {}
+    timings_path = os.path.join(tempfile.mkdtemp(), "timings.json")
+
+    for input_name, (verts, faces) in common.input_arrays(args.quick).items():
+        for cubes in (True, False):
+            for split in (True, False):
+                for cuts, rec_cuts in common.cut_matrix(args.quick):
+                    name = "%s/%s/%s/cuts%d/rec%d" % (input_name, "cube" if cubes else "ngon",
+                        "split" if split else "whole", cuts, rec_cuts)
+                    if args.filter and args.filter not in name:
+                        continue
+
+                    #A timings file left from the case before is never read as this one's
+                    def setup():
+                        if os.path.exists(timings_path):
+                            os.remove(timings_path)
+                        clear_scene()
+                        add_input(input_name, verts, faces)
+                        set_props(cubes, cuts, rec_cuts, split, timings_path)
+
+                    def generate():
+                        bpy.ops.view3d.random_shape()
+                        return len(bpy.context.scene.objects)
+
+                    #The case runs once, so the timings file is the one written by the timed run
+                    pieces, seconds, peak = common.measure(generate, not args.no_memory, setup)
+                    with open(timings_path) as f:
+                        timings = json.load(f)
+                    results[name] = {"time": seconds, "pieces": pieces, "peak_memory": peak,
+                        "phases": {phase: stats["time"] for phase, stats in timings["phases"].items()}}
+                    print("%s: %.3fs, %d pieces" % (name, seconds, pieces))
+    clear_scene()
+    return results
+
+
+if __name__ == "__main__":
+    args = common.parse_args("Benchmark the Random Shapes add-on in background Blender",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_blender.json"))
+    register_addon()
+    sys.exit(common.finish(args, run(args)))
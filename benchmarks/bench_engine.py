@@ -0,0 +1,95 @@
+#Benchmarks the pure Python/NumPy cutting code without Blender.
+#
+#    python benchmarks/bench_engine.py [--quick] [--save-baseline]
+#
+#Exits with 1 when a case is slower than the baseline allows.
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import common
+
+common.add_addon_path()
+from rs_engine import (CutSettings, Piece, BoxFractureJob, ParallelFractureJob, Stream, boxes_from_piece, pack_pieces,
+    unpack_pieces, split_faces, split_islands, island_chunks, make_planes, seed_key, VoronoiJob)
+
+
+SEED = 1
+MAX_PIECES = 1000000
+CHUNK_FACES = 1000
+#Inputs cut at any angle by the NumPy cutter, bigger ones take too long to be worth timing every run
+NGON_INPUTS = ("cube", "grid_10")
+VORONOI_CELLS = (1000, 10000)
+
+def inputs(quick):
+    return {name: Piece(verts, faces.tolist(), (0, 0, 0)) for name, (verts, faces) in common.input_arrays(quick).items()}
+
+def box_case(source, split, cuts, rec_cuts):
+    if split:
+        source = split_faces(source)
+    boxes = boxes_from_piece(source)
+    if boxes is None:#Not made of boxes, the NumPy cutter cuts this one
+        return None
+    bounds, sides, originals = boxes
+    settings = CutSettings(True, cuts, rec_cuts, 100, ["x", "y", "z"])
+    job = BoxFractureJob(bounds, sides, settings, source.center(), source.dimensions(),
+        seed_key(SEED), max_pieces=MAX_PIECES, originals=originals).run()
+    packed = job.packed()
+    return len(packed.vert_counts), len(packed.verts)
+
+#Cuts at any angle with the NumPy cutter, in this process with 1 worker
+def ngon_case(source, workers, cuts, rec_cuts):
+    source = split_faces(source)
+    source.stream = Stream(seed_key(SEED))
+    settings = CutSettings(False, cuts, rec_cuts, 100, ["x", "y", "z"])
+    first_planes = make_planes(source, settings, source.stream)
+    chunks = island_chunks(source, CHUNK_FACES)
+    packed = ParallelFractureJob(chunks, settings, first_planes, workers, MAX_PIECES).run().packed()
+    return len(packed.vert_counts), len(packed.verts)
+
+#Breaks the surface into cells in one pass
+def voronoi_case(source, cells):
+    packed = VoronoiJob(source, cells, seed_key(SEED), MAX_PIECES).run().packed()
+    return len(packed.vert_counts), len(packed.verts)
+
+def run(args):
+    results = {}
+
+    def add(name, func):
+        if args.filter and args.filter not in name:
+            return
+        random.seed(SEED)
+        counts, seconds, peak = common.measure(func, not args.no_memory)
+        if counts is None:
+            return
+        pieces, verts = counts
+        results[name] = {"time": seconds, "pieces": pieces, "verts": verts, "peak_memory": peak}
+
+    for input_name, source in inputs(args.quick).items():
+        for split in (True, False):
+            for cuts, rec_cuts in common.cut_matrix(args.quick):
+                name = "boxes/%s/%s/cuts%d/rec%d" % (input_name, "split" if split else "whole", cuts, rec_cuts)
+                add(name, lambda: box_case(source, split, cuts, rec_cuts))
+
+        if input_name in NGON_INPUTS:
+            for workers in sorted({1, os.cpu_count() or 1}):
+                name = "ngon/%s/workers%d/cuts4/rec2" % (input_name, workers)
+                add(name, lambda: ngon_case(source, workers, 4, 2))
+
+        if input_name in NGON_INPUTS:
+            for cells in VORONOI_CELLS:
+                add("voronoi/%s/cells%d" % (input_name, cells), lambda: voronoi_case(source, cells))
+
+        add("split_faces/%s" % input_name, lambda: (len(split_faces(source).faces), 0))
+        add("split_islands/%s" % input_name, lambda: (len(split_islands(split_faces(source))), 0))
+        add("pack_unpack/%s" % input_name,
+            lambda: (len(unpack_pieces(pack_pieces(split_islands(split_faces(source))))), 0))
+    return results
+
+
+if __name__ == "__main__":
+    args = common.parse_args("Benchmark the Random Shapes cutting engine without Blender",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_engine.json"))
+    sys.exit(common.finish(args, run(args)))
@@ -0,0 +1,140 @@
+#Shared helpers for the benchmark scripts: timing cases, baselines and regression checks
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:#Windows
+    resource = None
+
+#Folder holding the add-on, rs_engine is importable from here without Blender
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+#Vertices and quads of a closed cube from -1 to 1
+def cube_arrays():
+    verts = np.array([(x, y, z) for z in (-1, 1) for y in (-1, 1) for x in (-1, 1)], dtype=np.float64)
+    faces = np.array([(0, 4, 6, 2), (1, 3, 7, 5), (0, 1, 5, 4), (2, 6, 7, 3), (0, 2, 3, 1), (4, 5, 7, 6)])
+    return verts, faces
+
+#Vertices and quads of a flat n by n grid from -1 to 1
+def grid_arrays(n):
+    coords = np.linspace(-1, 1, n + 1)
+    x, y = np.meshgrid(coords, coords)
+    verts = np.stack([x.ravel(), y.ravel(), np.zeros(x.size)], axis=1)
+    i, j = np.meshgrid(np.arange(n), np.arange(n))
+    first = (j * (n + 1) + i).ravel()
+    faces = np.stack([first, first + 1, first + n + 2, first + n + 1], axis=1)
+    return verts, faces
+
+#Input meshes from a cube up to a 50k face grid
+def input_arrays(quick):
+    if quick:
+        return {"cube": cube_arrays(), "grid_100": grid_arrays(100)}
+    return {"cube": cube_arrays(), "grid_10": grid_arrays(10), "grid_100": grid_arrays(100), "grid_224": grid_arrays(224)}
+
+#The cuts and recursive cuts to run
+def cut_matrix(quick):
+    cuts_values = [1, 4] if quick else range(1, 9)
+    rec_values = [0, 2] if quick else range(0, 5)
+    return [(cuts, rec_cuts) for cuts in cuts_values for rec_cuts in rec_values]
+
+def add_addon_path():
+    if ADDON_DIR not in sys.path:
+        sys.path.insert(0, ADDON_DIR)
+
+#Command line options shared by every benchmark. Blender passes script arguments after "--"
+def parse_args(description, default_baseline):
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--baseline", default=default_baseline, help="Baseline JSON to compare against or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline instead of comparing")
+    parser.add_argument("--output", default="", help="Also write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="A case regresses when it is this many times slower than the baseline")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Seconds of slack before a slower case counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="Run a small subset of the cases")
+    parser.add_argument("--no-memory", action="store_true", help="Don't record the peak memory of every case")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    return parser.parse_args(argv)
+
+#Lets the peak resident memory start again from what is in use now. Only Linux allows it, elsewhere the peak is the
+#highest of the whole process so far
+def reset_peak_memory():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+#Peak resident memory of this process in bytes, so memory used by NumPy and Blender counts as well as Python's.
+#0 where the system has no getrusage
+def peak_memory():
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+#Returns func()'s result with its wall time and the peak memory of the process while it ran. setup() runs untimed first
+def measure(func, memory=True, setup=None):
+    if setup is not None:
+        setup()
+    if memory:
+        reset_peak_memory()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = peak_memory() if memory else 0
+    return result, seconds, peak
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["cases"]
+
+def save_results(path, results):
+    with open(path, "w") as f:
+        json.dump({"python": sys.version.split()[0], "cases": results}, f, indent=2, sort_keys=True)
+
+#Returns a list of (name, message) for every case that got slower than the baseline allows
+def compare(results, baseline, threshold, min_time):
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base["time"] * threshold + min_time
+        if result["time"] > limit:
+            regressions.append((name, "%.3fs, baseline %.3fs" % (result["time"], base["time"])))
+    return regressions
+
+def print_results(results, baseline):
+    print("%-60s %10s %10s %10s %12s" % ("case", "time", "baseline", "pieces", "peak MB"))
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        base_time = "%.3f" % base["time"] if base else "-"
+        print("%-60s %10.3f %10s %10d %12.1f" % (name, result["time"], base_time, result["pieces"], result["peak_memory"] / 1e6))
+
+#Saves or compares the results and returns the exit code
+def finish(args, results):
+    if args.output:
+        save_results(args.output, results)
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print("Saved baseline to %s" % args.baseline)
+        return 0
+    baseline = load_baseline(args.baseline)
+    print_results(results, baseline)
+    if not baseline:
+        print("No baseline at %s, run with --save-baseline to create one" % args.baseline)
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.min_time)
+    for name, message in regressions:
+        print("REGRESSION %s: %s" % (name, message))
+    return 1 if regressions else 0
@@ -0,0 +1,38 @@
+#Reads objects into pieces for the cutting engine. It never changes mode or selection.
+
+import numpy as np
+
+from .rs_engine import Piece, faces_from_arrays, offsets
+
+
+#Reads an object's mesh into a world space piece, the piece origin is the object location
+def piece_from_object(obj):
+    mesh = obj.data
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float64)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3)
+    matrix = np.array(obj.matrix_world)
+    verts = co @ matrix[:3, :3].T + matrix[:3, 3]
+    loops = np.empty(len(mesh.loops), dtype=np.int64)
+    mesh.loops.foreach_get("vertex_index", loops)
+    sizes = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("loop_total", sizes)
+    starts = np.empty(len(mesh.polygons), dtype=np.int64)
+    mesh.polygons.foreach_get("loop_start", starts)
+    #Loops in polygon order, they are almost always stored that way already
+    order = np.repeat(starts - offsets(sizes), sizes) + np.arange(len(loops))
+    loops = loops[order]
+    faces = faces_from_arrays(loops, sizes)
+    materials = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", materials)
+    #Two columns for every UV layer, in the order of mesh.uv_layers. A mesh without UV layers gets no columns
+    layers = len(mesh.uv_layers)
+    uvs = np.empty((layers, len(order) * 2), dtype=np.float32)
+    for layer, row in zip(mesh.uv_layers, uvs):
+        layer.data.foreach_get("uv", row)
+    uvs = uvs.reshape(layers, len(order), 2).transpose(1, 0, 2).reshape(len(order), layers * 2)[order]
+    return Piece(verts, faces, tuple(obj.location), None, materials, uvs)
+
+#Names of the materials and UV layers of an object's mesh, the material indices and UV columns of its pieces refer to them
+def surface_names(obj):
+    return [material.name if material else None for material in obj.data.materials], [layer.name for layer in obj.data.uv_layers]
@@ -0,0 +1,100 @@
+#Turns cut pieces into objects in the scene. Takes packed arrays so it works with any cutting engine
+
+import bpy
+import numpy as np
+
+from .rs_engine import loop_counts, offsets, packed_origins
+
+
+#Fills an empty mesh from vertex and face arrays with smooth shading on every face
+def fill_mesh(mesh, verts, loops, face_sizes):
+    mesh.vertices.add(len(verts))
+    mesh.loops.add(len(loops))
+    mesh.polygons.add(len(face_sizes))
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(verts, dtype=np.float32).ravel())
+    mesh.loops.foreach_set("vertex_index", np.ascontiguousarray(loops, dtype=np.int32))
+    mesh.polygons.foreach_set("loop_start", offsets(face_sizes).astype(np.int32))
+    #loop_total is read only from 4.0, it is worked out from loop_start
+    if bpy.app.version < (4, 0, 0):
+        mesh.polygons.foreach_set("loop_total", np.ascontiguousarray(face_sizes, dtype=np.int32))
+    mesh.polygons.foreach_set("use_smooth", np.ones(len(face_sizes), dtype=bool))
+    mesh.update(calc_edges=True)
+
+#Gives a filled mesh the materials of the source mesh, the material index of every face and a UV layer for every two
+#columns of uvs. surface is (materials, uv layer names) or None to leave the mesh without them
+def set_surface(mesh, face_materials, uvs, surface):
+    if surface is None:
+        return
+    materials, uv_names = surface
+    for material in materials:
+        mesh.materials.append(material)
+    mesh.polygons.foreach_set("material_index", np.ascontiguousarray(face_materials, dtype=np.int32))
+    for i, uv_name in enumerate(uv_names):
+        layer = mesh.uv_layers.new(name=uv_name)
+        layer.data.foreach_set("uv", np.ascontiguousarray(uvs[:, i * 2:i * 2 + 2], dtype=np.float32).ravel())
+
+#Creates one object per piece with its origin at the piece median
+def emit_pieces(packed, name, collection, surface=None):
+    origins = packed_origins(packed)
+    verts = packed.verts - np.repeat(origins, packed.vert_counts, axis=0)
+    vert_starts = offsets(packed.vert_counts)
+    face_starts = offsets(packed.face_counts)
+    piece_loops = loop_counts(packed)
+    loop_starts = offsets(piece_loops)
+
+    objects = []
+    for i, origin in enumerate(origins):
+        vs = vert_starts[i]
+        fs = face_starts[i]
+        ls = loop_starts[i]
+        mesh = bpy.data.meshes.new(name)
+        fill_mesh(mesh,
+            verts[vs:vs + packed.vert_counts[i]],
+            packed.loops[ls:ls + piece_loops[i]],
+            packed.face_sizes[fs:fs + packed.face_counts[i]])
+        set_surface(mesh, packed.materials[fs:fs + packed.face_counts[i]], packed.uvs[ls:ls + piece_loops[i]], surface)
+        ob = bpy.data.objects.new(name, mesh)
+        ob.location = origin
+        collection.objects.link(ob)
+        objects.append(ob)
+    return objects
+
+#Creates one object per piece using the mesh of its group, groups give the index in meshes of every piece
+def emit_shared(meshes, groups, origins, name, collection):
+    objects = []
+    for group, origin in zip(groups.tolist(), origins):
+        ob = bpy.data.objects.new(name, meshes[group])
+        ob.location = origin
+        collection.objects.link(ob)
+        objects.append(ob)
+    return objects
+
+#Creates a single object holding every piece. Each vertex stores its piece index and the piece center so pieces can still be told apart
+def emit_islands(packed, name, collection, location, surface=None):
+    origins = packed_origins(packed)
+    vert_offsets = np.repeat(offsets(packed.vert_counts), packed.face_counts)
+    loops = packed.loops + np.repeat(vert_offsets, packed.face_sizes)
+
+    mesh = bpy.data.meshes.new(name)
+    fill_mesh(mesh, packed.verts - location, loops, packed.face_sizes)
+    set_surface(mesh, packed.materials, packed.uvs, surface)
+    #Generic attributes were added in 2.91
+    if hasattr(mesh, "attributes"):
+        index = mesh.attributes.new("piece_index", 'INT', 'POINT')
+        index.data.foreach_set("value", np.repeat(np.arange(len(origins), dtype=np.int32), packed.vert_counts))
+        center = mesh.attributes.new("piece_center", 'FLOAT_VECTOR', 'POINT')
+        center.data.foreach_set("vector", np.repeat(origins - location, packed.vert_counts, axis=0).astype(np.float32).ravel())
+    ob = bpy.data.objects.new(name, mesh)
+    ob.location = location
+    collection.objects.link(ob)
+    return ob
+
+#Adds a vertex group where every vertex of a piece gets that piece's weight, or sets the weights of the group if it exists
+def set_piece_weights(ob, packed, weights, group_name):
+    group = ob.vertex_groups.get(group_name)
+    if group is None:
+        group = ob.vertex_groups.new(name=group_name)
+    starts = offsets(packed.vert_counts).tolist()
+    for start, count, weight in zip(starts, packed.vert_counts.tolist(), weights):
+        group.add(list(range(start, start + count)), weight, 'REPLACE')
+    return group
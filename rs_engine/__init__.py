@@ -0,0 +1,13 @@
+#Cutting engine for Random Shapes. Nothing in this package imports bpy so it can run outside of Blender.
+
+from .pieces import Piece, PackedPieces, split_faces, split_faces_by_angle, split_islands, island_chunks, faces_from_arrays, pack_pieces, unpack_pieces, pack_with_keys, unpack_with_keys, packed_origins, loop_counts, offsets, packed_chunks, take_pieces, shape_groups
+from .planes import random_num, random_vector, pick_axis, cut_range, cube_plane, ngon_plane, planes_split, split_planes
+from .fracture import CutSettings, FractureJob, make_planes, should_cut, fracture
+from .boxes import BoxFractureJob, boxes_from_piece, fracture_boxes, pack_boxes
+from .profile import Profile
+from .streams import Stream, seed_key, named_key, random_key, child_key, child_keys
+from .cutter import bisect_piece, slice_piece
+from .parallel import ParallelFractureJob
+from .cache import ResultCache, CachedJob, cache_key
+from .voronoi import VoronoiJob, surface_seeds
+from .export import EXPORT_FORMATS, PlyWriter, GlbWriter, NpyWriter, open_writer
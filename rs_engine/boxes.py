@@ -0,0 +1,446 @@
+#Axis aligned box engine for make_cubes mode. Every piece is one row of min/max bounds plus the sides that still have a face,
+#each round of cuts is done on the whole array at once and geometry is only built at the end.
+
+import time
+
+import numpy as np
+
+from .pieces import PackedPieces, face_arrays, split_islands
+from .streams import child_keys, draws, random_key
+
+
+#Cutting on "x" makes a cut along x, which splits the box on y. Same mapping as cube_plane
+AXIS_DIM = {"x": 1, "y": 0, "z": 2}
+
+#Corner c of a box is (x bit, y bit, z bit) = (c & 1, c >> 1 & 1, c >> 2 & 1), 0 being min and 1 max
+CORNER_BITS = np.array([[c & 1, c >> 1 & 1, c >> 2 & 1] for c in range(8)])
+
+#Sides are -x, +x, -y, +y, -z, +z. Quads are wound so the normal points out of the box
+SIDE_QUADS = np.array([(0, 4, 6, 2), (1, 3, 7, 5), (0, 1, 5, 4), (2, 6, 7, 3), (0, 2, 3, 1), (4, 5, 7, 6)])
+SIDE_CORNERS = np.array([[CORNER_BITS[c, s // 2] == s % 2 for c in range(8)] for s in range(6)])
+
+TOLERANCE = 1e-6
+
+
+#Position of every corner in the quad of each side it is on, -1 when it is not on that side
+SIDE_LOOP = np.full((6, 8), -1)
+for _side, _quad in enumerate(SIDE_QUADS):
+    SIDE_LOOP[_side, _quad] = np.arange(4)
+
+#Returns where each loop of a face on side goes in that side's quad. on_high is (loops, 3), the side's own dim is
+#taken from the side since a flat box is on both its low and high bounds there
+def quad_positions(on_high, side):
+    side = np.asarray(side)
+    bits = np.where(np.arange(3) == (side // 2)[..., None], (side % 2)[..., None], on_high)
+    return SIDE_LOOP[side, bits[..., 0] + 2 * bits[..., 1] + 4 * bits[..., 2]]
+
+#Returns (bounds, sides, materials, uvs) for an island that is an axis aligned box or a single axis aligned rectangle,
+#otherwise None. materials is the material of each side and uvs the UVs of each side's quad corners in SIDE_QUADS order
+def box_from_island(island):
+    verts = island.verts
+    if not len(verts):
+        return None
+    low = verts.min(axis=0)
+    high = verts.max(axis=0)
+    on_low = np.abs(verts - low) < TOLERANCE
+    on_high = np.abs(verts - high) < TOLERANCE
+    if not (on_low | on_high).all():
+        return None
+    flat = high - low < TOLERANCE
+    if flat.sum() > 1:
+        return None
+
+    sides = np.zeros(6, dtype=bool)
+    materials = np.zeros(6, dtype=np.int32)
+    uvs = np.zeros((6, 4, island.uvs.shape[1]), dtype=np.float32)
+    loop = 0
+    for material, face in zip(island.materials.tolist(), island.faces):
+        if len(face) != 4:
+            return None
+        face_low = on_low[list(face)]
+        face_high = on_high[list(face)]
+        side = None
+        if flat.any():
+            if len(island.faces) != 1:
+                return None
+            dim = int(np.argmax(flat))
+            a, b, c = verts[list(face[:3])]
+            side = dim * 2 + int(np.cross(b - a, c - a)[dim] > 0)
+        else:
+            for dim in range(3):
+                if face_low[:, dim].all():
+                    side = dim * 2
+                elif face_high[:, dim].all():
+                    side = dim * 2 + 1
+        #Face must be a whole side of the box, not a strip of it
+        if side is None or sides[side]:
+            return None
+        other = [d for d in range(3) if d != side // 2 and not flat[d]]
+        for dim in other:
+            if not (face_low[:, dim].any() and face_high[:, dim].any()):
+                return None
+        sides[side] = True
+        materials[side] = material
+        uvs[side, quad_positions(face_high, side)] = island.uvs[loop:loop + 4]
+        loop += 4
+    return np.array([low, high]), sides, materials, uvs
+
+#Returns (bounds, sides, materials, uvs) arrays when every (F, 4, 3) quad is an axis aligned rectangle, otherwise None.
+#Quads are given with the material of each and the (F, 4, K) UVs of their loops, see box_from_island
+def boxes_from_quads(quads, quad_materials, quad_uvs):
+    count = len(quads)
+    low = quads.min(axis=1)
+    high = quads.max(axis=1)
+    flat = high - low < TOLERANCE
+    if not (flat.sum(axis=1) == 1).all():
+        return None
+    on_low = np.abs(quads - low[:, None, :]) < TOLERANCE
+    on_high = np.abs(quads - high[:, None, :]) < TOLERANCE
+    if not (on_low | on_high).all():
+        return None
+
+    #Each quad must use all four corners of its rectangle
+    rows = np.arange(count)
+    dims = np.argmax(flat, axis=1)
+    other = np.array([[1, 2], [0, 2], [0, 1]])[dims]
+    corners = np.arange(4)[None, :]
+    codes = on_high[rows[:, None], corners, other[:, :1]] + 2 * on_high[rows[:, None], corners, other[:, 1:]]
+    if not (np.sort(codes, axis=1) == np.arange(4)).all():
+        return None
+
+    normals = np.cross(quads[:, 1] - quads[:, 0], quads[:, 2] - quads[:, 0])
+    sides = np.zeros((count, 6), dtype=bool)
+    side = dims * 2 + (normals[rows, dims] > 0)
+    sides[rows, side] = True
+    materials = np.zeros((count, 6), dtype=np.int32)
+    materials[rows, side] = quad_materials
+    uvs = np.zeros((count, 6, 4, quad_uvs.shape[2]), dtype=np.float32)
+    uvs[rows[:, None], side[:, None], quad_positions(on_high, side[:, None])] = quad_uvs
+    return np.stack([low, high], axis=1), sides, materials, uvs
+
+#Returns (bounds, sides, originals) for a piece made only of boxes, otherwise None. originals is what BoxFractureJob
+#needs to give the cut boxes the materials and UVs of the faces they were cut from
+def boxes_from_piece(piece):
+    loops, sizes = face_arrays(piece)
+    #Split faces, every face a loose quad
+    if len(sizes) and (sizes == 4).all() and np.bincount(loops).max() <= 1:
+        boxes = boxes_from_quads(piece.verts[loops].reshape(-1, 4, 3), piece.materials,
+            piece.uvs.reshape(len(sizes), 4, piece.uvs.shape[1]))
+        if boxes is None:
+            return None
+        return boxes[0], boxes[1], boxes
+    islands = [box_from_island(island) for island in split_islands(piece)]
+    if any(box is None for box in islands):
+        return None
+    columns = piece.uvs.shape[1]
+    bounds = np.array([box[0] for box in islands]).reshape(-1, 2, 3)
+    sides = np.array([box[1] for box in islands]).reshape(-1, 6)
+    materials = np.array([box[2] for box in islands], dtype=np.int32).reshape(len(islands), 6)
+    uvs = np.array([box[3] for box in islands], dtype=np.float32).reshape(len(islands), 6, 4, columns)
+    return bounds, sides, (bounds, sides, materials, uvs)
+
+#Returns the (P, 8, 3) corners of every box
+def box_corners(bounds):
+    return np.where(CORNER_BITS[None, :, :] == 1, bounds[:, None, 1, :], bounds[:, None, 0, :])
+
+#Returns which corners are used by a face of each box
+def used_corners(sides):
+    return (sides[:, :, None] & SIDE_CORNERS[None, :, :]).any(axis=1)
+
+#Median and bounding box size of the vertices of each box, same as piece.center and piece.dimensions
+def box_centers(bounds, sides):
+    corners = box_corners(bounds)
+    used = used_corners(sides)
+    count = np.maximum(used.sum(axis=1), 1)[:, None]
+    centers = (corners * used[:, :, None]).sum(axis=1) / count
+    low = np.where(used[:, :, None], corners, np.inf).min(axis=1)
+    high = np.where(used[:, :, None], corners, -np.inf).max(axis=1)
+    return centers, high - low
+
+#Sorted cell edges of every box along each axis padded with inf, and the number of cells along each axis.
+#cut_dims and cut_coords are (P, K), a dim of -1 means no cut
+def cell_edges(bounds, cut_dims, cut_coords):
+    edges = []
+    sizes = []
+    for dim in range(3):
+        low = bounds[:, 0, dim][:, None]
+        high = bounds[:, 1, dim][:, None]
+        inside = (cut_dims == dim) & (cut_coords > low) & (cut_coords < high)
+        values = np.where(inside, cut_coords, np.inf)
+        edges.append(np.sort(np.concatenate([low, values, high], axis=1), axis=1))
+        sizes.append(inside.sum(axis=1) + 1)
+    return edges, sizes
+
+#Splits every box by its cut coordinates. Each new box gets a stream key made from its parent's key and its cell index,
+#and the root of its parent, the box it was first cut from
+def split_boxes(bounds, sides, keys, roots, cut_dims, cut_coords, edges=None, sizes=None):
+    if edges is None:
+        edges, sizes = cell_edges(bounds, cut_dims, cut_coords)
+    count = len(bounds)
+    nx, ny, nz = sizes
+    cells = nx * ny * nz
+
+    parent = np.repeat(np.arange(count), cells)
+    local = np.arange(cells.sum()) - np.repeat(np.cumsum(cells) - cells, cells)
+    index = [local % nx[parent], (local // nx[parent]) % ny[parent], local // (nx * ny)[parent]]
+
+    new_bounds = np.empty((len(parent), 2, 3))
+    new_sides = np.empty((len(parent), 6), dtype=bool)
+    for dim in range(3):
+        new_bounds[:, 0, dim] = edges[dim][parent, index[dim]]
+        new_bounds[:, 1, dim] = edges[dim][parent, index[dim] + 1]
+        #Only the outer sides keep their faces, the cut sides are left open like an unfilled bisect
+        new_sides[:, dim * 2] = sides[parent, dim * 2] & (index[dim] == 0)
+        new_sides[:, dim * 2 + 1] = sides[parent, dim * 2 + 1] & (index[dim] == sizes[dim][parent] - 1)
+    return separate_boxes(new_bounds, new_sides, child_keys(keys[parent], local), roots[parent])
+
+#Same as separating loose parts. Boxes with no faces are removed and boxes left with only two opposite faces become two pieces
+def separate_boxes(bounds, sides, keys, roots):
+    keep = sides.any(axis=1)
+    bounds = bounds[keep]
+    sides = sides[keep]
+    keys = keys[keep]
+    roots = roots[keep]
+
+    opposite = np.zeros(len(sides), dtype=bool)
+    for dim in range(3):
+        pair = np.zeros(6, dtype=bool)
+        pair[dim * 2:dim * 2 + 2] = True
+        opposite |= (sides == pair).all(axis=1)
+    if not opposite.any():
+        return bounds, sides, keys, roots
+
+    pairs_bounds = np.repeat(bounds[opposite], 2, axis=0)
+    pairs_sides = np.repeat(sides[opposite], 2, axis=0)
+    dims = np.argmax(pairs_sides, axis=1) // 2
+    hi = np.tile([0, 1], int(opposite.sum()))
+    rows = np.arange(len(pairs_bounds))
+    #Flatten each half onto its own side
+    pairs_bounds[rows, 1 - hi, dims] = pairs_bounds[rows, hi, dims]
+    pairs_sides[:] = False
+    pairs_sides[rows, dims * 2 + hi] = True
+    pairs_keys = child_keys(np.repeat(keys[opposite], 2), hi)
+    return (np.concatenate([bounds[~opposite], pairs_bounds]), np.concatenate([sides[~opposite], pairs_sides]),
+        np.concatenate([keys[~opposite], pairs_keys]), np.concatenate([roots[~opposite], np.repeat(roots[opposite], 2)]))
+
+#Runs every level of cuts and recursive cuts on the boxes, one level per step.
+#location and dimensions are used for the first level, where all boxes share the same cuts like the original mesh does.
+#Cutting stops early once max_pieces pieces would exist or max_time seconds have passed, 0 means no limit.
+#key is the stream key of the whole input, the first level cuts come from it and every box gets a key made from it.
+#Boxes handed over from a kept level come with their keys and the level they are on.
+#With keep_levels the boxes of every finished level are kept with their keys.
+#originals are the input boxes from boxes_from_piece, every box keeps the index of the one it was cut from in roots
+class BoxFractureJob:
+    def __init__(self, bounds, sides, settings, location, dimensions, key=None, max_pieces=0, max_time=0, profile=None,
+            keep_levels=False, keys=None, level=0, originals=None, roots=None):
+        self.bounds = bounds
+        self.sides = sides
+        self.settings = settings
+        self.location = location
+        self.dimensions = dimensions
+        self.key = random_key() if key is None else key
+        if keys is None:
+            keys = child_keys(np.full(len(bounds), self.key, dtype=np.uint64), np.arange(len(bounds)))
+        self.keys = keys
+        self.originals = originals
+        self.roots = np.arange(len(bounds)) if roots is None else roots
+        self.kept_levels = {} if keep_levels else None
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        self.profile = profile
+        self.axis_dims = np.array([AXIS_DIM[axis] for axis in settings.axes])
+        self.level = level
+        self.pieces_done = 0
+        self.pieces_written = 0
+        self.output = None
+        self.output_size = 0
+        self.done = False
+        self.stopped = None
+        self.start_time = None
+
+    #A level is cut all at once, so every box waits until the next step
+    @property
+    def pieces_remaining(self):
+        return 0 if self.done else len(self.bounds)
+
+    @property
+    def piece_count(self):
+        return len(self.bounds) + self.pieces_written
+
+    def progress(self):
+        if self.done:
+            return 1.0
+        return self.level / (self.settings.rec_cuts + 1)
+
+    #Picks the cuts for every box on the current level. Draw 0 is the rec_chance roll, then an axis and an offset for each cut
+    def level_cuts(self):
+        settings = self.settings
+        if self.level == 0:
+            #The whole input shares the first cuts
+            group = np.zeros(len(self.bounds), dtype=int)
+            centers = np.array([self.location], dtype=np.float64)
+            dims = np.array([self.dimensions], dtype=np.float64)
+            keys = np.array([self.key], dtype=np.uint64)
+            cutting = np.ones(1, dtype=bool)
+        else:
+            #Every box picks its own cuts from its own center and dimensions
+            group = np.arange(len(self.bounds))
+            centers, dims = box_centers(self.bounds, self.sides)
+            keys = self.keys
+            cutting = np.floor(draws(keys, 0) * 101) < settings.rec_chance
+
+        groups = len(centers)
+        axis_draws = np.array([draws(keys, 1 + i * 2) for i in range(settings.cuts)]).T.reshape(groups, settings.cuts)
+        offset_draws = np.array([draws(keys, 2 + i * 2) for i in range(settings.cuts)]).T.reshape(groups, settings.cuts)
+        axis_index = np.minimum((axis_draws * len(self.axis_dims)).astype(int), len(self.axis_dims) - 1)
+        dim_index = self.axis_dims[axis_index]
+        cut_range = (dims / 2) - ((dims / 2) * .1)
+        rows = np.arange(groups)[:, None]
+        cut_coords = centers[rows, dim_index] + (offset_draws * 2 - 1) * cut_range[rows, dim_index]
+        cut_dims = np.where(cutting[:, None], dim_index, -1)
+        return cut_dims[group], cut_coords[group]
+
+    #Leaves boxes uncut from the first one that would take the piece count over max_pieces
+    def limit_cuts(self, cut_dims, sizes):
+        cells = sizes[0] * sizes[1] * sizes[2]
+        count = len(cells)
+        totals = np.cumsum(cells) + (count - 1 - np.arange(count))
+        over = np.flatnonzero(totals > self.max_pieces)
+        if not len(over):
+            return cut_dims
+        self.stopped = "piece limit of %d reached" % self.max_pieces
+        cut_dims = cut_dims.copy()
+        cut_dims[over[0]:] = -1
+        return cut_dims
+
+    #Cuts one level. The budget is not used since a level can not be split, it is there to match FractureJob
+    def step(self, budget=None):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        if self.done or self.level > self.settings.rec_cuts:
+            self.done = True
+            return True
+        if self.max_time and time.perf_counter() - self.start_time >= self.max_time:
+            self.stopped = "time limit of %g seconds reached" % self.max_time
+            self.done = True
+            return True
+
+        level_start = time.perf_counter()
+        pieces_in = len(self.bounds)
+        cut_dims, cut_coords = self.level_cuts()
+        edges, sizes = cell_edges(self.bounds, cut_dims, cut_coords)
+        if self.max_pieces:
+            limited = self.limit_cuts(cut_dims, sizes)
+            if limited is not cut_dims:
+                cut_dims = limited
+                edges, sizes = cell_edges(self.bounds, cut_dims, cut_coords)
+        self.pieces_done += len(self.bounds)
+        self.bounds, self.sides, self.keys, self.roots = split_boxes(self.bounds, self.sides, self.keys, self.roots, cut_dims,
+            cut_coords, edges, sizes)
+        if self.profile is not None:
+            verts = int(used_corners(self.sides).sum())
+            self.profile.add_level(self.level, time.perf_counter() - level_start, pieces_in, len(self.bounds), verts)
+        #A level cut short by max_pieces is not kept
+        if self.kept_levels is not None and not self.stopped:
+            self.kept_levels[self.level] = (self.bounds, self.sides, self.keys, self.roots)
+        self.level += 1
+        if self.stopped or self.level > self.settings.rec_cuts:
+            self.done = True
+            if self.output is not None:
+                self.hand_over()
+        return self.done
+
+    def run(self):
+        while not self.step():
+            pass
+        return self
+
+    #Packs the boxes of the last level size boxes at a time and hands them to output(packed) instead of keeping them,
+    #packed() is then empty. Not for jobs that keep levels
+    def stream_to(self, output, size):
+        self.output = output
+        self.output_size = size
+
+    def hand_over(self):
+        for start in range(0, len(self.bounds), self.output_size):
+            end = start + self.output_size
+            self.output(pack_boxes(self.bounds[start:end], self.sides[start:end], self.roots[start:end], self.originals))
+        self.pieces_written += len(self.bounds)
+        self.release()
+
+    #Stops cutting, the boxes cut so far are kept
+    def cancel(self):
+        self.stopped = "cancelled"
+        self.done = True
+
+    def packed(self):
+        return pack_boxes(self.bounds, self.sides, self.roots, self.originals)
+
+    #Drops the boxes once the result is packed, only the kept levels stay
+    def release(self):
+        self.bounds = np.empty((0, 2, 3))
+        self.sides = np.empty((0, 6), dtype=bool)
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.roots = np.empty(0, dtype=int)
+
+    #Packed arrays of a kept level, or None
+    def packed_level(self, level):
+        if not self.kept_levels or level not in self.kept_levels:
+            return None
+        bounds, sides, keys, roots = self.kept_levels[level]
+        return pack_boxes(bounds, sides, roots, self.originals)
+
+    #A new job that cuts the deepest kept level on down to rec_cuts, it keeps the levels of this one
+    def resumed(self, rec_cuts, profile=None):
+        level = max(self.kept_levels)
+        bounds, sides, keys, roots = self.kept_levels[level]
+        job = BoxFractureJob(bounds, sides, self.settings._replace(rec_cuts=rec_cuts), self.location, self.dimensions,
+            self.key, self.max_pieces, self.max_time, profile, True, keys, level + 1, self.originals, roots)
+        job.kept_levels.update(self.kept_levels)
+        return job
+
+
+#Runs every level of cuts and recursive cuts on the boxes
+def fracture_boxes(bounds, sides, settings, location, dimensions, key=None):
+    job = BoxFractureJob(bounds, sides, settings, location, dimensions, key).run()
+    return job.bounds, job.sides
+
+#Material and UVs of every face of the boxes. A face takes the material of the side of its root box it lies on, its UVs
+#are blended from the UVs of that side's corners by where its corners are in the root box
+def box_face_data(corners, rows, side, roots, originals):
+    if originals is None:
+        return np.zeros(len(side), dtype=np.int32), np.empty((len(side) * 4, 0), dtype=np.float32)
+    root_bounds, root_sides, root_materials, root_uvs = originals
+    root = roots[rows]
+    materials = root_materials[root, side]
+    if not root_uvs.shape[3]:
+        return materials, np.empty((len(side) * 4, 0), dtype=np.float32)
+    quads = SIDE_QUADS[side]
+    low = root_bounds[root, 0]
+    size = root_bounds[root, 1] - low
+    t = np.divide(corners[rows[:, None], quads] - low[:, None], size[:, None], out=np.zeros((len(side), 4, 3)),
+        where=size[:, None] > 0)
+    #Weight of each root corner for each loop, the side's own dim is left out
+    bits = CORNER_BITS[quads][:, None, :, :]
+    normal = np.arange(3)[None, None, None, :] == (side // 2)[:, None, None, None]
+    weights = np.where(normal, 1, np.where(bits == 1, t[:, :, None, :], 1 - t[:, :, None, :]))
+    uvs = np.einsum("flj,fjk->flk", weights.prod(axis=3), root_uvs[root, side])
+    return materials, uvs.reshape(-1, root_uvs.shape[3]).astype(np.float32)
+
+#Builds packed vertex and face arrays for every box, only corners used by a face become vertices.
+#roots and originals give the faces their materials and UVs, see BoxFractureJob
+def pack_boxes(bounds, sides, roots=None, originals=None):
+    corners = box_corners(bounds)
+    used = used_corners(sides)
+    remap = np.cumsum(used, axis=1) - 1
+    rows, side = np.nonzero(sides)
+    loops = remap[rows[:, None], SIDE_QUADS[side]]
+    materials, uvs = box_face_data(corners, rows, side, roots, originals)
+    return PackedPieces(
+        corners[used],
+        loops.ravel().astype(np.int32),
+        np.full(len(side), 4, dtype=np.int32),
+        used.sum(axis=1).astype(np.int32),
+        sides.sum(axis=1).astype(np.int32),
+        materials,
+        uvs)
@@ -0,0 +1,123 @@
+#Cut results saved on disk so generating again with the same mesh, settings and seed only has to read them back.
+#Each result is one .npz file named by its key, the least recently used files are removed once the cache is too big.
+
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from .pieces import PackedPieces, empty_packed, face_arrays
+
+#Changes whenever cutting gives different pieces for the same key, so old results are never used
+CACHE_VERSION = 3
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "random_shapes_cache")
+
+
+#Key of a result. piece is the mesh as read, before splitting faces. settings is anything that changes the pieces,
+#given as a tuple of numbers and strings
+def cache_key(piece, settings):
+    loops, sizes = face_arrays(piece)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(repr((CACHE_VERSION, tuple(settings))).encode())
+    for array in (piece.verts, loops, sizes, piece.materials, piece.uvs):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory="", max_bytes=0):
+        self.directory = directory or DEFAULT_DIR
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    #Returns the saved pieces or None. Reading a result marks it as recently used
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path) as data:
+                packed = PackedPieces(*[data[field] for field in PackedPieces._fields])
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return packed
+
+    #Saves the pieces, then removes old results until the cache fits in max_bytes. Written to a temporary file first
+    #so a half written result is never read
+    def put(self, key, packed):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        handle, temp_path = tempfile.mkstemp(suffix=".npz.tmp", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as f:
+                np.savez(f, **packed._asdict())
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict(keep=path)
+
+    #Removes the least recently used results until the cache fits, keep is never removed
+    def evict(self, keep=None):
+        if not self.max_bytes:
+            return
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for used, size, path in files)
+        for used, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+#Same interface as FractureJob for a result read from the cache, it is done before it starts
+class CachedJob:
+    def __init__(self, packed, profile=None):
+        self.result_packed = packed
+        self.profile = profile
+        self.kept_levels = None
+        self.level = 0
+        self.pieces_done = 0
+        self.pieces_remaining = 0
+        self.piece_count = len(packed.vert_counts)
+        self.done = True
+        self.stopped = None
+
+    def progress(self):
+        return 1.0
+
+    def step(self, budget=None):
+        return True
+
+    def run(self):
+        return self
+
+    def cancel(self):
+        pass
+
+    def packed(self):
+        return self.result_packed
+
+    #The result is read in one go, packed() has all of it
+    def stream_to(self, output, size):
+        pass
+
+    def release(self):
+        self.result_packed = empty_packed()
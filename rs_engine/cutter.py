@@ -0,0 +1,134 @@
+#Cutting engine in plain Python and NumPy. Works like bmesh.ops.bisect_plane followed by split_edges but needs no
+#Blender, so it can run in worker processes. The add-on cuts with it in any number of processes so a seed always
+#gives the same shapes. Vertices closer to a plane than DIST count as on the plane.
+
+import numpy as np
+
+from .pieces import Piece, split_islands
+from .profile import Profile
+
+#Same as the dist given to bmesh.ops.bisect_plane
+DIST = 0.0001
+
+
+#Bisects every face of a piece by a plane. Vertices on the plane and new vertices on cut edges get one copy for each side,
+#so the two sides no longer share any vertex
+def bisect_piece(piece, plane_co, plane_no):
+    normal = np.asarray(plane_no, dtype=np.float64)
+    length = np.linalg.norm(normal)
+    if length == 0 or not len(piece.verts):
+        return piece
+    normal = normal / length
+    dist = (piece.verts - np.asarray(plane_co, dtype=np.float64)) @ normal
+    side = np.where(dist > DIST, 1, np.where(dist < -DIST, -1, 0))
+    #Nothing on the negative side, or nothing on the positive side, means nothing is cut
+    if not (side < 0).any() or not (side > 0).any():
+        return piece
+
+    side = side.tolist()
+    dist = dist.tolist()
+    verts = piece.verts.tolist()
+    new_verts = []
+    below_copies = {}
+    edge_copies = {}
+
+    def add_vert(co):
+        new_verts.append(co)
+        return len(verts) + len(new_verts) - 1
+
+    #Copy of a vertex on the plane used by faces on the negative side, the positive side keeps the original
+    def below_copy(index):
+        if index not in below_copies:
+            below_copies[index] = add_vert(verts[index])
+        return below_copies[index]
+
+    #The two copies of the point where an edge crosses the plane, worked out from the edge in a fixed order
+    def edge_copy(a, b):
+        key = (a, b) if a < b else (b, a)
+        if key not in edge_copies:
+            a, b = key
+            t = dist[a] / (dist[a] - dist[b])
+            co = [va + (vb - va) * t for va, vb in zip(verts[a], verts[b])]
+            edge_copies[key] = (add_vert(co), add_vert(co))
+        return edge_copies[key]
+
+    faces = []
+    materials = []
+    #Every loop of the new faces comes from a loop of the old face or from between two of them, as (from, to, t).
+    #Only worked out when there are UVs to blend
+    has_uvs = piece.uvs.shape[1] > 0
+    uv_rows = []
+    loop = 0
+    for face, material in zip(piece.faces, piece.materials.tolist()):
+        count = len(face)
+        sides = [side[i] for i in face]
+        if -1 not in sides:
+            faces.append(face)
+            materials.append(material)
+            if has_uvs:
+                uv_rows.extend((row, row, 0.0) for row in range(loop, loop + count))
+        elif 1 not in sides:
+            faces.append(tuple(below_copy(i) if s == 0 else i for i, s in zip(face, sides)))
+            materials.append(material)
+            if has_uvs:
+                uv_rows.extend((row, row, 0.0) for row in range(loop, loop + count))
+        else:
+            above = []
+            below = []
+            above_uvs = []
+            below_uvs = []
+            for n in range(count):
+                a = face[n]
+                b = face[(n + 1) % count]
+                side_a = sides[n]
+                side_b = sides[(n + 1) % count]
+                row = (loop + n, loop + n, 0.0)
+                if side_a > 0:
+                    above.append(a)
+                    above_uvs.append(row)
+                elif side_a < 0:
+                    below.append(a)
+                    below_uvs.append(row)
+                else:
+                    above.append(a)
+                    below.append(below_copy(a))
+                    above_uvs.append(row)
+                    below_uvs.append(row)
+                if side_a * side_b < 0:
+                    copy_above, copy_below = edge_copy(a, b)
+                    above.append(copy_above)
+                    below.append(copy_below)
+                    row = (loop + n, loop + (n + 1) % count, dist[a] / (dist[a] - dist[b]))
+                    above_uvs.append(row)
+                    below_uvs.append(row)
+            for part, part_uvs in ((above, above_uvs), (below, below_uvs)):
+                if len(part) > 2:
+                    faces.append(tuple(part))
+                    materials.append(material)
+                    if has_uvs:
+                        uv_rows.extend(part_uvs)
+        loop += count
+    if new_verts:
+        verts = np.concatenate([piece.verts, np.array(new_verts, dtype=np.float64)])
+    else:
+        verts = piece.verts
+    uvs = None
+    if has_uvs:
+        rows = np.array(uv_rows, dtype=np.float64).reshape(-1, 3)
+        start = piece.uvs[rows[:, 0].astype(np.int64)]
+        end = piece.uvs[rows[:, 1].astype(np.int64)]
+        uvs = start + (end - start) * rows[:, 2:].astype(np.float32)
+    return Piece(verts, faces, piece.origin, piece.stream, materials, uvs)
+
+#Makes every cut on a piece and returns its loose parts, the cut_piece a FractureJob is given
+def slice_piece(piece, planes, profile=None):
+    if profile is None:
+        profile = Profile()
+    with profile.phase("bisect"):
+        cut = piece
+        for plane_co, plane_no in planes:
+            cut = bisect_piece(cut, plane_co, plane_no)
+    with profile.phase("islands"):
+        islands = split_islands(cut)
+    profile.count("islands", len(islands), len(cut.verts))
+    return islands
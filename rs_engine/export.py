@@ -0,0 +1,257 @@
+#Writes pieces straight to disk without making objects. Pieces are added a batch at a time and only the batch being
+#written is held in memory. Every format needs totals in front of the geometry, so the geometry goes to temporary
+#files next to the output first and is copied behind the header when the writer is closed.
+#Every piece comes with its origin, the median of its vertices like the objects get, and its Solidify thickness
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+from .pieces import offsets, packed_origins
+
+EXPORT_FORMATS = ("PLY", "GLB", "NPY")
+
+
+#Bytes of one array written a part at a time, count is the rows written so far
+class Spool:
+    def __init__(self, directory, dtype, shape=()):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.dtype = np.dtype(dtype)
+        self.shape = shape
+        self.count = 0
+        self.nbytes = 0
+
+    def write(self, array):
+        data = np.ascontiguousarray(array, dtype=self.dtype).tobytes()
+        self.file.write(data)
+        self.count += len(array)
+        self.nbytes += len(data)
+
+    #Copies everything written behind what is already in f, then frees the temporary file
+    def copy_to(self, f):
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, f, 1 << 20)
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+
+
+#Loops of packed pieces numbered across every piece, first is the number of the first vertex
+def global_loops(packed, first):
+    vert_offsets = np.repeat(offsets(packed.vert_counts), packed.face_counts)
+    return packed.loops + np.repeat(vert_offsets, packed.face_sizes) + first
+
+#Fan triangles of every face, as loop positions into packed.loops
+def fan_triangles(face_sizes):
+    tri_counts = np.maximum(face_sizes - 2, 0)
+    starts = np.repeat(offsets(face_sizes), tri_counts)
+    corner = np.arange(int(tri_counts.sum())) - np.repeat(offsets(tri_counts), tri_counts) + 1
+    return np.stack([starts, starts + corner, starts + corner + 1], axis=1), tri_counts
+
+
+#Shared by every writer: add pieces, then close to write the file. Used as a context manager the file is only
+#written when nothing went wrong
+class PieceWriter:
+    def __init__(self, path):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(self.directory, exist_ok=True)
+        self.spools = []
+        self.piece_total = 0
+        self.vert_total = 0
+
+    def spool(self, dtype, shape=()):
+        spool = Spool(self.directory, dtype, shape)
+        self.spools.append(spool)
+        return spool
+
+    #Writes a batch of packed pieces with the Solidify thickness of every piece
+    def add(self, packed, thickness):
+        if len(packed.vert_counts):
+            self.write(packed, packed_origins(packed), np.asarray(thickness, dtype=np.float64))
+        self.piece_total += len(packed.vert_counts)
+        self.vert_total += len(packed.verts)
+
+    def discard(self):
+        for spool in self.spools:
+            spool.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, trace):
+        if kind is None:
+            self.close()
+        else:
+            self.discard()
+
+
+#Binary PLY in world space. Every vertex has the index of its piece, the piece element holds origins and thickness
+#Materials and UVs are not written, PLY keeps UVs per vertex and pieces have them per loop
+class PlyWriter(PieceWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.verts = self.spool(np.dtype([("co", "<f4", 3), ("piece", "<i4")]))
+        self.faces = self.spool("<i4")
+        self.face_total = 0
+        self.pieces = self.spool("<f4", (4,))
+
+    def write(self, packed, origins, thickness):
+        verts = np.empty(len(packed.verts), dtype=self.verts.dtype)
+        verts["co"] = packed.verts
+        verts["piece"] = np.repeat(np.arange(len(packed.vert_counts)) + self.piece_total, packed.vert_counts)
+        self.verts.write(verts)
+        #Every face is its loop count followed by its loops
+        face_starts = offsets(packed.face_sizes + 1)
+        rows = np.empty(len(packed.face_sizes) + len(packed.loops), dtype=np.int32)
+        rows[face_starts] = packed.face_sizes
+        is_loop = np.ones(len(rows), dtype=bool)
+        is_loop[face_starts] = False
+        rows[is_loop] = global_loops(packed, self.vert_total)
+        self.faces.write(rows)
+        self.face_total += len(packed.face_sizes)
+        self.pieces.write(np.concatenate([origins, thickness[:, None]], axis=1))
+
+    def close(self):
+        header = "\n".join([
+            "ply",
+            "format binary_little_endian 1.0",
+            "comment Random Shapes pieces",
+            "element vertex %d" % self.verts.count,
+            "property float x",
+            "property float y",
+            "property float z",
+            "property int piece",
+            "element face %d" % self.face_total,
+            "property list int int vertex_indices",
+            "element piece %d" % self.pieces.count,
+            "property float origin_x",
+            "property float origin_y",
+            "property float origin_z",
+            "property float thickness",
+            "end_header", ""])
+        with open(self.path, "wb") as f:
+            f.write(header.encode("ascii"))
+            for spool in (self.verts, self.faces, self.pieces):
+                spool.copy_to(f)
+
+
+#Blender's Z up coordinates as glTF's Y up ones, (x, y, z) becomes (x, z, -y) like Blender's glTF exporter does
+def y_up(co):
+    return np.stack([co[:, 0], co[:, 2], -co[:, 1]], axis=1)
+
+#Binary glTF with one node and mesh per piece. Vertices are relative to the piece origin, which is the node's
+#translation, and the thickness is in the node's extras. Faces are split into fans of triangles.
+#Positions and translations are turned from Blender's Z up to glTF's Y up
+#Only the shapes are written, materials and UVs are left to the NPY export
+class GlbWriter(PieceWriter):
+    def __init__(self, path):
+        super().__init__(path)
+        self.buffer = self.spool("u1")
+        #Per piece: byte offset and count of the positions and the indices, bounds, origin and thickness
+        self.entries = []
+
+    def write(self, packed, origins, thickness):
+        vert_starts = offsets(packed.vert_counts)
+        local = y_up(packed.verts - np.repeat(origins, packed.vert_counts, axis=0)).astype(np.float32)
+        origins = y_up(origins)
+        low = np.minimum.reduceat(local, vert_starts)
+        high = np.maximum.reduceat(local, vert_starts)
+        triangles, tri_counts = fan_triangles(packed.face_sizes)
+        indices = packed.loops[triangles].astype(np.uint32)
+        piece_tris = np.add.reduceat(tri_counts, offsets(packed.face_counts))
+
+        position_start = self.buffer.nbytes
+        self.buffer.write(local.view(np.uint8).ravel())
+        index_start = self.buffer.nbytes
+        self.buffer.write(indices.view(np.uint8).ravel())
+        rows = zip((position_start + vert_starts * 12).tolist(), packed.vert_counts.tolist(),
+            (index_start + offsets(piece_tris) * 12).tolist(), (piece_tris * 3).tolist(),
+            low.tolist(), high.tolist(), origins.tolist(), thickness.tolist())
+        self.entries.extend(rows)
+
+    def document(self):
+        views = []
+        accessors = []
+        meshes = []
+        nodes = []
+        for i, (position_start, vert_count, index_start, index_count, low, high, origin, thickness) in enumerate(self.entries):
+            views.append({"buffer": 0, "byteOffset": position_start, "byteLength": vert_count * 12, "target": 34962})
+            views.append({"buffer": 0, "byteOffset": index_start, "byteLength": index_count * 4, "target": 34963})
+            accessors.append({"bufferView": 2 * i, "componentType": 5126, "count": vert_count, "type": "VEC3", "min": low, "max": high})
+            accessors.append({"bufferView": 2 * i + 1, "componentType": 5125, "count": index_count, "type": "SCALAR"})
+            meshes.append({"primitives": [{"attributes": {"POSITION": 2 * i}, "indices": 2 * i + 1}]})
+            nodes.append({"name": "piece_%d" % i, "mesh": i, "translation": origin, "extras": {"thickness": thickness}})
+        document = {"asset": {"version": "2.0", "generator": "Random Shapes"}, "scene": 0,
+            "scenes": [{"nodes": list(range(len(nodes)))}], "nodes": nodes, "meshes": meshes, "accessors": accessors,
+            "bufferViews": views}
+        if self.buffer.nbytes:
+            document["buffers"] = [{"byteLength": self.buffer.nbytes}]
+        return document
+
+    def close(self):
+        text = json.dumps(self.document(), separators=(",", ":")).encode()
+        text += b" " * (-len(text) % 4)
+        padding = -self.buffer.nbytes % 4
+        total = 12 + 8 + len(text) + (8 + self.buffer.nbytes + padding if self.buffer.nbytes else 0)
+        with open(self.path, "wb") as f:
+            f.write(struct.pack("<4sII", b"glTF", 2, total))
+            f.write(struct.pack("<I4s", len(text), b"JSON"))
+            f.write(text)
+            if self.buffer.nbytes:
+                f.write(struct.pack("<I4s", self.buffer.nbytes + padding, b"BIN\0"))
+                self.buffer.copy_to(f)
+                f.write(b"\0" * padding)
+            else:
+                self.buffer.discard()
+
+
+#The packed arrays as .npy files named path_verts.npy and so on, with path_origins.npy and path_thickness.npy.
+#Vertices are in world space and loops are local to their piece, the same as PackedPieces
+class NpyWriter(PieceWriter):
+    def __init__(self, path):
+        super().__init__(os.path.splitext(path)[0])
+        self.arrays = {
+            "verts": self.spool("<f8", (3,)),
+            "loops": self.spool("<i4"),
+            "face_sizes": self.spool("<i4"),
+            "vert_counts": self.spool("<i4"),
+            "face_counts": self.spool("<i4"),
+            "materials": self.spool("<i4"),
+            #Two columns for every UV layer, set from the first pieces written
+            "uvs": self.spool("<f4", (0,)),
+            "origins": self.spool("<f8", (3,)),
+            "thickness": self.spool("<f8"),
+        }
+
+    def write(self, packed, origins, thickness):
+        self.arrays["uvs"].shape = packed.uvs.shape[1:]
+        for name, array in packed._asdict().items():
+            self.arrays[name].write(array)
+        self.arrays["origins"].write(origins)
+        self.arrays["thickness"].write(thickness)
+
+    def close(self):
+        for name, spool in self.arrays.items():
+            with open("%s_%s.npy" % (self.path, name), "wb") as f:
+                np.lib.format.write_array_header_1_0(f, {"descr": spool.dtype.str, "fortran_order": False,
+                    "shape": (spool.count,) + spool.shape})
+                spool.copy_to(f)
+
+
+#Opens a writer for one of EXPORT_FORMATS. PLY and GLB get their extension if path has none
+def open_writer(export_format, path):
+    if export_format == "NPY":
+        return NpyWriter(path)
+    if not os.path.splitext(path)[1]:
+        path += "." + export_format.lower()
+    if export_format == "PLY":
+        return PlyWriter(path)
+    if export_format == "GLB":
+        return GlbWriter(path)
+    raise ValueError("Unknown export format %s" % export_format)
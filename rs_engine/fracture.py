@@ -0,0 +1,202 @@
+import random
+import time
+from collections import namedtuple
+
+from .planes import cube_plane, split_planes, cut_range
+from .pieces import pack_pieces, pack_with_keys, unpack_with_keys
+
+
+#Cut settings read from RandomShapeProps, kept free of bpy so engines can run anywhere
+CutSettings = namedtuple("CutSettings", ["cubes", "cuts", "rec_cuts", "rec_chance", "axes"])
+
+
+#Returns the cut planes for one piece, all planes use the piece's location and dimensions before cutting.
+#Cuts at any angle that would miss the piece or cut off a sliver are left out
+def make_planes(piece, settings, rng=random):
+    location = piece.center()
+    dim = cut_range(piece.dimensions())
+    if not settings.cubes:
+        return split_planes(piece.verts, settings.cuts, location, dim, rng)
+    planes = []
+    for i in range(settings.cuts):
+        planes.append(cube_plane(settings.axes, location, dim, rng))
+    return planes
+
+#Rolls rec_chance to decide if a piece is cut again
+def should_cut(settings, rng=random):
+    num = rng.randint(0, 100)
+    return num in range(0, settings.rec_chance)
+
+#Random stream of a piece, pieces without one use the random module
+def piece_rng(piece):
+    return random if piece.stream is None else piece.stream
+
+#Gives every child of a piece its own stream made from the parent's stream
+def give_streams(piece, children):
+    if piece.stream is not None:
+        for i, child in enumerate(children):
+            child.stream = piece.stream.child(i)
+
+
+#Runs every level of cuts and recursive cuts a few pieces at a time so the work can be spread over many calls.
+#cut_piece(piece, planes) returns the loose pieces after cutting.
+#Cutting stops early once max_pieces pieces exist or max_time seconds have passed, 0 means no limit.
+#first_planes are used for every piece on the first level, so chunks of one mesh are cut the same as the whole mesh.
+#level is the level the pieces are on, pieces handed over from another job's first level start on level 1.
+#Pieces left uncut on a level get a new stream made from their old one, so a piece's stream key is all it needs to carry on.
+#With keep_levels the pieces of every finished level are kept packed with their stream keys.
+#Pieces with a stream draw from it and pass streams on to the pieces cut from them
+class FractureJob:
+    def __init__(self, pieces, settings, cut_piece, max_pieces=0, max_time=0, profile=None, first_planes=None, level=0, keep_levels=False):
+        self.settings = settings
+        self.first_planes = first_planes
+        self.cut_piece = cut_piece
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        self.profile = profile
+        self.kept_levels = {} if keep_levels else None
+        self.level = level
+        self.current = list(pieces)
+        self.index = 0
+        self.next = []
+        self.pieces_done = 0
+        self.pieces_written = 0
+        self.output = None
+        self.output_size = 0
+        self.done = False
+        self.stopped = None
+        self.start_time = None
+
+    #Pieces waiting to be cut on this level
+    @property
+    def pieces_remaining(self):
+        return len(self.current) - self.index
+
+    #Pieces that exist right now, cut or not, with the pieces handed to output
+    @property
+    def piece_count(self):
+        return len(self.next) + self.pieces_remaining + self.pieces_written
+
+    #Rough progress from 0 to 1 based on levels finished
+    def progress(self):
+        if self.done:
+            return 1.0
+        level_progress = self.index / len(self.current) if self.current else 1.0
+        return (self.level + level_progress) / (self.settings.rec_cuts + 1)
+
+    #Checks the piece and time limits, stops the job if one is hit
+    def over_limit(self):
+        if self.max_pieces and self.piece_count >= self.max_pieces:
+            self.stopped = "piece limit of %d reached" % self.max_pieces
+        elif self.max_time and time.perf_counter() - self.start_time >= self.max_time:
+            self.stopped = "time limit of %g seconds reached" % self.max_time
+        else:
+            return False
+        self.done = True
+        return True
+
+    #Cuts pieces until the time budget in seconds runs out, None runs until finished. Returns True when the job is done
+    def step(self, budget=None):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        end = None if budget is None else time.perf_counter() + budget
+        settings = self.settings
+        while not self.done:
+            if self.index == len(self.current):
+                #Level finished, the new pieces become the pieces to cut
+                if self.kept_levels is not None:
+                    self.kept_levels[self.level] = pack_with_keys(self.next)
+                self.current = self.next
+                self.next = []
+                self.index = 0
+                self.level += 1
+                if self.level > settings.rec_cuts:
+                    self.done = True
+                    break
+            if self.over_limit():
+                break
+
+            piece = self.current[self.index]
+            self.index += 1
+            self.pieces_done += 1
+            rng = piece_rng(piece)
+            #First loop always cuts otherwise determine if recursive cuts happen
+            if self.level > 0 and not should_cut(settings, rng):
+                give_streams(piece, [piece])
+                self.next.append(piece)
+            else:
+                cut_start = time.perf_counter()
+                if self.level == 0 and self.first_planes is not None:
+                    planes = self.first_planes
+                else:
+                    planes = make_planes(piece, settings, rng)
+                cut = self.cut_piece(piece, planes)
+                give_streams(piece, cut)
+                self.next.extend(cut)
+                if self.profile is not None:
+                    self.profile.add_level(self.level, time.perf_counter() - cut_start, 1, len(cut), sum(len(p.verts) for p in cut))
+            #Pieces made on the last level are finished
+            if self.output is not None and self.level == settings.rec_cuts and len(self.next) >= self.output_size:
+                self.hand_over()
+
+            if end is not None and time.perf_counter() >= end:
+                break
+        return self.done
+
+    #Runs the job to the end
+    def run(self):
+        while not self.step():
+            pass
+        return self
+
+    #Hands the finished pieces of the last level to output(packed) size pieces at a time instead of keeping them,
+    #packed() then only has the pieces not handed over yet. Not for jobs that keep levels
+    def stream_to(self, output, size):
+        self.output = output
+        self.output_size = size
+
+    def hand_over(self):
+        pieces = self.next
+        self.next = []
+        self.pieces_written += len(pieces)
+        self.output(pack_pieces(pieces))
+
+    #Stops cutting, the pieces cut so far are kept
+    def cancel(self):
+        self.stopped = "cancelled"
+        self.done = True
+
+    #Every piece that exists right now. Pieces not cut because the job stopped early are kept as they are
+    def result(self):
+        if self.level > self.settings.rec_cuts:
+            return list(self.current)
+        return self.next + self.current[self.index:]
+
+    def packed(self):
+        return pack_pieces(self.result())
+
+    #Drops the pieces once the result is packed, only the kept levels stay
+    def release(self):
+        self.current = []
+        self.next = []
+        self.index = 0
+
+    #Packed arrays of a kept level, or None
+    def packed_level(self, level):
+        if not self.kept_levels or level not in self.kept_levels:
+            return None
+        return self.kept_levels[level][0]
+
+    #A new job that cuts the deepest kept level on down to rec_cuts, it keeps the levels of this one
+    def resumed(self, rec_cuts, profile=None, cut_piece=None):
+        level = max(self.kept_levels)
+        pieces = unpack_with_keys(*self.kept_levels[level])
+        job = FractureJob(pieces, self.settings._replace(rec_cuts=rec_cuts), cut_piece or self.cut_piece,
+            self.max_pieces, self.max_time, profile, level=level + 1, keep_levels=True)
+        job.kept_levels.update(self.kept_levels)
+        return job
+
+
+#Runs every level of cuts and recursive cuts. cut_piece(piece, planes) returns the loose pieces after cutting
+def fracture(pieces, settings, cut_piece):
+    return FractureJob(pieces, settings, cut_piece).run().result()
@@ -0,0 +1,328 @@
+#Cuts pieces in a pool of worker processes. Every piece is cut independently of its siblings and draws from its own
+#random stream, so whole subtrees of recursive cuts can be handed to workers and the result is the same as cutting
+#them one after another in this process with slice_piece.
+#Pieces go to the workers as packed arrays with their stream keys, the cut pieces come back through shared memory.
+
+import functools
+import multiprocessing
+import os
+import sys
+import time
+import types
+from contextlib import contextmanager
+
+import numpy as np
+
+#Shared memory came with Python 3.8, Blender before 2.93 runs 3.7 and cuts every task in this process instead
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from .cutter import slice_piece
+from .fracture import CutSettings, FractureJob
+from .pieces import PackedPieces, empty_packed, pack_with_keys, packed_chunks, unpack_with_keys
+from .profile import Profile
+
+#Folder holding rs_engine, workers import it from there without the add-on or Blender
+ENGINE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#Tasks per worker on the recursive levels, more tasks even out the work but cost more overhead
+TASKS_PER_WORKER = 4
+
+
+#Writes arrays into one block of shared memory. Returns the block's name and the dtype and shape of every array
+def write_shared(arrays):
+    size = sum(array.nbytes for array in arrays)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    layout = []
+    offset = 0
+    for array in arrays:
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf, offset=offset)
+        view[...] = array
+        layout.append((array.dtype.str, array.shape))
+        offset += array.nbytes
+    del view
+    block.close()
+    return block.name, layout
+
+#Copies arrays out of a block made by write_shared and frees the block
+def read_shared(name, layout):
+    block = shared_memory.SharedMemory(name=name)
+    arrays = []
+    offset = 0
+    for dtype, shape in layout:
+        view = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+        arrays.append(view.copy())
+        offset += view.nbytes
+    del view
+    block.close()
+    block.unlink()
+    return arrays
+
+#Joins packed arrays one after another
+def concat_packed(parts):
+    parts = [part for part in parts if len(part.vert_counts)]
+    if not parts:
+        return empty_packed()
+    return PackedPieces(*[np.concatenate(arrays) for arrays in zip(*parts)])
+
+#Runs in a worker: cuts the pieces from level to the last level and returns the shared memory holding the result,
+#with the timings of the worker and why it stopped early, if it did. Without shared the result arrays are returned as they are. Packed arrays and settings come as plain tuples,
+#the add-on's namedtuples can't be unpickled without importing the add-on.
+#A task never makes more than max_pieces pieces and stops at deadline, a time.time() value, 0 means no limit
+def cut_subtrees(packed, keys, settings, level, first_planes, max_pieces=0, deadline=0, shared=True):
+    pieces = unpack_with_keys(PackedPieces(*packed), keys)
+    profile = Profile()
+    max_time = max(deadline - time.time(), 1e-9) if deadline else 0
+    job = FractureJob(pieces, CutSettings(*settings), functools.partial(slice_piece, profile=profile), max_pieces, max_time,
+        profile=profile, first_planes=first_planes, level=level).run()
+    result, result_keys = pack_with_keys(job.result())
+    arrays = list(result) + [result_keys]
+    return write_shared(arrays) if shared else arrays, profile.phases, profile.levels, job.stopped
+
+#Stops multiprocessing from running the script Blender was started with in every worker
+@contextmanager
+def plain_main():
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+#Starts worker processes that import rs_engine as a top level package, so they never import bpy.
+#The engine folder is only on sys.path while the workers start, they take their own copy of it
+def start_pool(workers):
+    added = ENGINE_PATH not in sys.path
+    if added:
+        sys.path.insert(0, ENGINE_PATH)
+    try:
+        import rs_engine.parallel
+        with plain_main():
+            pool = multiprocessing.get_context("spawn").Pool(workers)
+    finally:
+        if added:
+            sys.path.remove(ENGINE_PATH)
+    return pool, rs_engine.parallel.cut_subtrees
+
+
+#Same interface as FractureJob. The first level cuts every chunk in its own task, then the pieces cut from them are
+#shared out to the workers in runs of neighbouring pieces and each task cuts every level left below its pieces.
+#Results are put back together in task order, which is the order a serial run makes them in.
+#max_pieces and max_time are checked when a task finishes and are passed on to every task, so a task stops cutting
+#at the time limit or once it alone has made max_pieces pieces. Pieces in tasks that were not finished are kept uncut.
+#workers of 1 or less, or a Python without shared memory, cuts in this process without a pool.
+#Pieces given with a level above 0 are shared out straight away. With keep_levels the first and last levels are kept,
+#the levels in between are only ever seen by the workers.
+#Tasks of the last level are handed to the stream_to output in task order as soon as every task before them is collected
+class ParallelFractureJob:
+    def __init__(self, pieces, settings, first_planes, workers, max_pieces=0, max_time=0, profile=None, keep_levels=False, level=0):
+        self.settings = settings
+        self.first_planes = first_planes
+        self.workers = workers
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        self.profile = profile
+        self.kept_levels = {} if keep_levels else None
+        self.first_level = level
+        self.level = level
+        self.pool = None
+        self.cut_subtrees = cut_subtrees
+        if level == 0:
+            self.inputs = [pack_with_keys([piece]) for piece in pieces]
+        else:
+            self.inputs = self.share(pieces)
+        self.outputs = [None] * len(self.inputs)
+        self.pending = {}
+        self.pieces_done = 0
+        self.pieces_written = 0
+        self.written = 0
+        self.output = None
+        self.output_size = 0
+        self.done = False
+        self.stopped = None
+        self.start_time = None
+
+    @property
+    def pieces_remaining(self):
+        return sum(len(self.inputs[i][0].vert_counts) for i, output in enumerate(self.outputs) if output is None)
+
+    @property
+    def piece_count(self):
+        return (sum(len(output[0].vert_counts) for output in self.outputs if output is not None) + self.pieces_remaining
+            + self.pieces_written)
+
+    #The first level counts as one level of rec_cuts + 1, the tasks below it as the rest of the levels
+    def progress(self):
+        if self.done:
+            return 1.0
+        finished = sum(output is not None for output in self.outputs) / max(len(self.outputs), 1)
+        if self.level == 0:
+            return finished / (self.settings.rec_cuts + 1)
+        first = max(self.first_level, 1)
+        return (first + finished * (self.settings.rec_cuts + 1 - first)) / (self.settings.rec_cuts + 1)
+
+    def over_limit(self):
+        if self.max_pieces and self.piece_count >= self.max_pieces:
+            self.stopped = "piece limit of %d reached" % self.max_pieces
+        elif self.max_time and time.perf_counter() - self.start_time >= self.max_time:
+            self.stopped = "time limit of %g seconds reached" % self.max_time
+        else:
+            return False
+        self.finish()
+        return True
+
+    #Settings, level and planes the tasks of the current level are run with
+    def task_args(self):
+        if self.level == 0:
+            return self.settings._replace(rec_cuts=0), 0, self.first_planes
+        return self.settings, self.level, None
+
+    #Splits pieces into runs of neighbouring pieces, one task each
+    def share(self, pieces):
+        size = max(-(-len(pieces) // (max(self.workers, 1) * TASKS_PER_WORKER)), 1)
+        return [pack_with_keys(pieces[i:i + size]) for i in range(0, len(pieces), size)]
+
+    #Sends every task of the level to the pool, or cuts them here without a pool
+    def submit(self):
+        settings, level, first_planes = self.task_args()
+        deadline = time.time() + self.max_time - (time.perf_counter() - self.start_time) if self.max_time else 0
+        for i, (packed, keys) in enumerate(self.inputs):
+            args = (tuple(packed), keys, tuple(settings), level, first_planes, self.max_pieces, deadline)
+            if self.pool is None:
+                self.pending[i] = args + (False,)
+            else:
+                self.pending[i] = self.pool.apply_async(self.cut_subtrees, args)
+
+    #Stores the result of a finished task. A task that hit a limit stops the job
+    def collect(self, i, result):
+        arrays, phases, levels, stopped = result
+        if self.pool is not None:
+            arrays = read_shared(*arrays)
+        fields = len(PackedPieces._fields)
+        self.outputs[i] = (PackedPieces(*arrays[:fields]), arrays[fields])
+        self.pieces_done += len(self.inputs[i][0].vert_counts)
+        if self.profile is not None:
+            self.profile.merge(phases, levels)
+        if self.output is not None and (self.level > 0 or self.settings.rec_cuts == 0):
+            self.hand_over()
+        if stopped:
+            self.stopped = stopped
+            self.finish()
+
+    #Hands every collected task that has no uncollected task before it to output and drops its pieces
+    def hand_over(self):
+        while self.written < len(self.outputs) and self.outputs[self.written] is not None:
+            packed = self.outputs[self.written][0]
+            self.outputs[self.written] = (empty_packed(), np.empty(0, dtype=np.uint64))
+            self.written += 1
+            self.pieces_written += len(packed.vert_counts)
+            for chunk in packed_chunks(packed, self.output_size):
+                self.output(chunk)
+
+    #Packed arrays and keys of every finished task joined in order
+    def joined_outputs(self):
+        keys = [output[1] for output in self.outputs]
+        return concat_packed([output[0] for output in self.outputs]), np.concatenate(keys) if keys else np.empty(0, dtype=np.uint64)
+
+    #Called when every task of a level is finished. After the first level its pieces are shared out for the rest
+    def level_finished(self):
+        packed, keys = self.joined_outputs()
+        if self.level > 0 or self.settings.rec_cuts == 0:
+            if self.kept_levels is not None:
+                self.kept_levels[self.settings.rec_cuts] = (packed, keys)
+            self.finish()
+            return
+        if self.kept_levels is not None:
+            self.kept_levels[0] = (packed, keys)
+        self.level = 1
+        self.inputs = self.share(unpack_with_keys(packed, keys))
+        self.outputs = [None] * len(self.inputs)
+        self.written = 0
+        self.submit()
+
+    #Cuts until the time budget in seconds runs out, None runs until finished. Returns True when the job is done
+    def step(self, budget=None):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+            if self.level > self.settings.rec_cuts:
+                self.finish()
+                return True
+            if self.workers > 1 and shared_memory is not None:
+                self.pool, self.cut_subtrees = start_pool(self.workers)
+            self.submit()
+        end = None if budget is None else time.perf_counter() + budget
+        while not self.done:
+            if not self.pending:
+                self.level_finished()
+                continue
+            if self.over_limit():
+                break
+            if self.pool is None:
+                i = min(self.pending)
+                self.collect(i, cut_subtrees(*self.pending.pop(i)))
+            else:
+                finished = [i for i, result in self.pending.items() if result.ready()]
+                if not finished:
+                    next(iter(self.pending.values())).wait(0.01)
+                for i in finished:
+                    if self.done:
+                        break
+                    self.collect(i, self.pending.pop(i).get())
+            if end is not None and time.perf_counter() >= end:
+                break
+        return self.done
+
+    def run(self):
+        while not self.step():
+            pass
+        return self
+
+    #Stops the workers, tasks still running are thrown away and their pieces kept uncut
+    def finish(self):
+        self.done = True
+        if self.pool is not None:
+            #Frees the shared memory of tasks that finished but were not collected
+            for result in self.pending.values():
+                if result.ready() and result.successful():
+                    read_shared(*result.get()[0])
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self.pending = {}
+
+    def cancel(self):
+        self.stopped = "cancelled"
+        self.finish()
+
+    #Hands the pieces of the last level to output(packed) size pieces at a time instead of keeping them, packed() then
+    #only has the pieces not handed over yet. Not for jobs that keep levels
+    def stream_to(self, output, size):
+        self.output = output
+        self.output_size = size
+
+    #Every piece that exists right now in the order a serial run makes them, joined in one set of arrays
+    def packed(self):
+        return concat_packed([output[0] if output is not None else packed
+            for (packed, keys), output in zip(self.inputs, self.outputs)])
+
+    #Drops the pieces of every task once the result is packed, only the kept levels stay
+    def release(self):
+        self.inputs = []
+        self.outputs = []
+
+    #Packed arrays of a kept level, or None
+    def packed_level(self, level):
+        if not self.kept_levels or level not in self.kept_levels:
+            return None
+        return self.kept_levels[level][0]
+
+    #A new job that cuts the deepest kept level on down to rec_cuts, it keeps the levels of this one
+    def resumed(self, rec_cuts, profile=None):
+        level = max(self.kept_levels)
+        pieces = unpack_with_keys(*self.kept_levels[level])
+        job = ParallelFractureJob(pieces, self.settings._replace(rec_cuts=rec_cuts), None, self.workers,
+            self.max_pieces, self.max_time, profile, True, level + 1)
+        job.kept_levels.update(self.kept_levels)
+        return job
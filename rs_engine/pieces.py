@@ -0,0 +1,315 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .streams import Stream, random_key
+
+
+#A single fractured piece: world space vertices and faces as tuples of vertex indices
+#stream is the piece's own random stream, None uses the random module.
+#materials is the material index of every face and uvs the UVs of every loop in face order, two columns per UV layer.
+#Pieces without them get material 0 and no UV layers
+class Piece:
+    __slots__ = ("verts", "faces", "origin", "stream", "materials", "uvs")
+
+    def __init__(self, verts, faces, origin=None, stream=None, materials=None, uvs=None):
+        self.verts = np.asarray(verts, dtype=np.float64).reshape(-1, 3)
+        self.faces = [tuple(face) for face in faces]
+        self.origin = origin
+        self.stream = stream
+        if materials is None:
+            materials = np.zeros(len(self.faces), dtype=np.int32)
+        self.materials = np.asarray(materials, dtype=np.int32)
+        if uvs is None:
+            uvs = np.empty((sum(len(face) for face in self.faces), 0), dtype=np.float32)
+        self.uvs = np.asarray(uvs, dtype=np.float32)
+
+    #Median of the vertices unless an origin was given, same as ORIGIN_GEOMETRY with center='MEDIAN'
+    def center(self):
+        if self.origin is not None:
+            return tuple(self.origin)
+        if not len(self.verts):
+            return (0.0, 0.0, 0.0)
+        return tuple(self.verts.mean(axis=0))
+
+    #Bounding box size, same as object dimensions
+    def dimensions(self):
+        if not len(self.verts):
+            return (0.0, 0.0, 0.0)
+        return tuple(self.verts.max(axis=0) - self.verts.min(axis=0))
+
+    def __len__(self):
+        return len(self.faces)
+
+
+#Flat loop and face size arrays for the faces of a piece
+def face_arrays(piece):
+    sizes = np.fromiter((len(face) for face in piece.faces), dtype=np.int64, count=len(piece.faces))
+    loops = np.fromiter((index for face in piece.faces for index in face), dtype=np.int64, count=int(sizes.sum()))
+    return loops, sizes
+
+#Rebuilds faces as tuples from flat loop and face size arrays
+def faces_from_arrays(loops, sizes):
+    flat = loops.tolist()
+    faces = []
+    start = 0
+    for end in np.cumsum(sizes).tolist():
+        faces.append(tuple(flat[start:end]))
+        start = end
+    return faces
+
+#Gives every face its own vertices, same as an Edge Split modifier with a split angle of 0
+def split_faces(piece):
+    loops, sizes = face_arrays(piece)
+    return Piece(piece.verts[loops], faces_from_arrays(np.arange(len(loops)), sizes), piece.origin, piece.stream,
+        piece.materials, piece.uvs)
+
+#Unit normal of every face, worked out with Newell's method so ngons work too
+def face_normals(verts, loops, sizes):
+    starts = offsets(sizes)
+    next_loops = np.arange(len(loops)) + 1
+    next_loops[starts + sizes - 1] = starts
+    a = verts[loops]
+    b = verts[loops[next_loops]]
+    terms = np.stack([(a[:, 1] - b[:, 1]) * (a[:, 2] + b[:, 2]),
+                      (a[:, 2] - b[:, 2]) * (a[:, 0] + b[:, 0]),
+                      (a[:, 0] - b[:, 0]) * (a[:, 1] + b[:, 1])], axis=1)
+    normals = np.add.reduceat(terms, starts) if len(starts) else np.empty((0, 3))
+    length = np.linalg.norm(normals, axis=1)[:, None]
+    return normals / np.where(length > 0, length, 1)
+
+#Union find over index pairs, returns a root for every index
+def connected_roots(count, pairs):
+    parent = list(range(count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in pairs:
+        root_a = find(a)
+        root_b = find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+    return np.array([find(i) for i in range(count)], dtype=np.int64)
+
+#Splits the edges between faces that are not coplanar, so every flat region gets its own vertices.
+#Faces meeting at less than angle radians stay joined
+def split_faces_by_angle(piece, angle=1e-4):
+    loops, sizes = face_arrays(piece)
+    if not len(sizes):
+        return piece
+    starts = offsets(sizes)
+    face_of_loop = np.repeat(np.arange(len(sizes)), sizes)
+    next_loops = np.arange(len(loops)) + 1
+    next_loops[starts + sizes - 1] = starts
+    edges = np.sort(np.stack([loops, loops[next_loops]], axis=1), axis=1)
+    edge_keys, edge_index = np.unique(edges, axis=0, return_inverse=True)
+    edge_index = edge_index.ravel()
+
+    #Faces of every edge used by exactly two faces
+    order = np.argsort(edge_index, kind="stable")
+    counts = np.bincount(edge_index, minlength=len(edge_keys))
+    first = offsets(counts)
+    manifold = np.flatnonzero(counts == 2)
+    face_a = face_of_loop[order[first[manifold]]]
+    face_b = face_of_loop[order[first[manifold] + 1]]
+
+    normals = face_normals(piece.verts, loops, sizes)
+    flat = np.einsum("ij,ij->i", normals[face_a], normals[face_b]) >= np.cos(angle)
+    groups = connected_roots(len(sizes), zip(face_a[flat].tolist(), face_b[flat].tolist()))
+
+    #Vertices are shared only inside a group
+    keys = groups[face_of_loop] * len(piece.verts) + loops
+    unique_keys, new_loops = np.unique(keys, return_inverse=True)
+    return Piece(piece.verts[unique_keys % len(piece.verts)], faces_from_arrays(new_loops.ravel(), sizes), piece.origin, piece.stream,
+        piece.materials, piece.uvs)
+
+#Returns the faces of every loose part as lists of face indices
+def face_islands(piece):
+    loops, sizes = face_arrays(piece)
+    #Split faces share no vertices so every face is its own island
+    if not len(loops) or np.bincount(loops).max() <= 1:
+        return [[i] for i in range(len(sizes))]
+    roots = connected_roots(len(piece.verts), ((face[0], index) for face in piece.faces for index in face[1:]))
+    groups = {}
+    for i, face in enumerate(piece.faces):
+        groups.setdefault(roots[face[0]], []).append(i)
+    return list(groups.values())
+
+#Rows of the loops of some faces, loop_starts is where every face's loops start
+def face_loop_rows(faces, face_indices, loop_starts):
+    sizes = np.fromiter((len(faces[i]) for i in face_indices), dtype=np.int64, count=len(face_indices))
+    return np.repeat(loop_starts[face_indices] - offsets(sizes), sizes) + np.arange(int(sizes.sum())), sizes
+
+#Makes a piece from some of the faces of another, only the vertices they use are kept.
+#loop_starts is where every face's loops start, worked out once by callers making many
+def sub_piece(piece, face_indices, origin=None, loop_starts=None):
+    if loop_starts is None:
+        loop_starts = offsets(face_arrays(piece)[1])
+    face_indices = np.asarray(face_indices, dtype=np.int64)
+    rows, sizes = face_loop_rows(piece.faces, face_indices.tolist(), loop_starts)
+    loops = np.fromiter((index for i in face_indices.tolist() for index in piece.faces[i]), dtype=np.int64, count=len(rows))
+    used, new_loops = np.unique(loops, return_inverse=True)
+    return Piece(piece.verts[used], faces_from_arrays(new_loops.ravel(), sizes), origin, None,
+        piece.materials[face_indices], piece.uvs[rows])
+
+#Splits a piece into its loose parts, same as separate(type='LOOSE')
+def split_islands(piece):
+    islands = face_islands(piece)
+    if len(islands) < 2:
+        return [Piece(piece.verts, piece.faces, None, None, piece.materials, piece.uvs)]
+    loop_starts = offsets(face_arrays(piece)[1])
+    if len(islands) == len(piece.faces):
+        return [Piece(piece.verts[list(face)], [tuple(range(len(face)))], None, None, piece.materials[i:i + 1],
+            piece.uvs[start:start + len(face)]) for i, (face, start) in enumerate(zip(piece.faces, loop_starts.tolist()))]
+    return [sub_piece(piece, faces, None, loop_starts) for faces in islands]
+
+#Groups whole loose parts into pieces of about max_faces faces so big inputs can be cut a chunk at a time.
+#Loose parts are never split, so cutting the chunks with the same planes gives the same pieces as cutting the whole
+def island_chunks(piece, max_faces):
+    chunks = []
+    chunk = []
+    for faces in face_islands(piece):
+        if chunk and len(chunk) + len(faces) > max_faces:
+            chunks.append(chunk)
+            chunk = []
+        chunk.extend(faces)
+    if chunk:
+        chunks.append(chunk)
+    loop_starts = offsets(face_arrays(piece)[1])
+    pieces = [sub_piece(piece, faces, piece.origin, loop_starts) for faces in chunks]
+    if piece.stream is not None:
+        for i, chunk in enumerate(pieces):
+            chunk.stream = piece.stream.child(i)
+    return pieces
+
+
+#Vertex and face arrays for many pieces at once. loops are vertex indices local to their piece,
+#face_sizes are the loop count of every face, vert_counts and face_counts split the arrays per piece.
+#materials is the material index of every face and uvs the UVs of every loop, two columns per UV layer
+PackedPieces = namedtuple("PackedPieces", ["verts", "loops", "face_sizes", "vert_counts", "face_counts", "materials", "uvs"])
+
+
+#Packs a list of pieces into one set of arrays
+def pack_pieces(pieces):
+    pieces = [piece for piece in pieces if len(piece.verts) and piece.faces]
+    if not pieces:
+        return empty_packed()
+    faces = [face for piece in pieces for face in piece.faces]
+    return PackedPieces(
+        np.concatenate([piece.verts for piece in pieces]),
+        np.fromiter((index for face in faces for index in face), dtype=np.int32),
+        np.fromiter((len(face) for face in faces), dtype=np.int32, count=len(faces)),
+        np.array([len(piece.verts) for piece in pieces], dtype=np.int32),
+        np.array([len(piece.faces) for piece in pieces], dtype=np.int32),
+        np.concatenate([piece.materials for piece in pieces]),
+        np.concatenate([piece.uvs for piece in pieces]))
+
+def empty_packed(uv_columns=0):
+    return PackedPieces(np.empty((0, 3)), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32),
+        np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32),
+        np.empty((0, uv_columns), dtype=np.float32))
+
+#Start offset of every piece or face in the arrays that follow it
+def offsets(counts):
+    return np.cumsum(counts) - counts
+
+#Number of loops in every piece
+def loop_counts(packed):
+    if not len(packed.face_counts):
+        return np.empty(0, dtype=np.int64)
+    return np.add.reduceat(packed.face_sizes, offsets(packed.face_counts)) * (packed.face_counts > 0)
+
+#Median of the vertices of every piece, same as ORIGIN_GEOMETRY with center='MEDIAN'
+def packed_origins(packed):
+    if not len(packed.vert_counts):
+        return np.empty((0, 3))
+    return np.add.reduceat(packed.verts, offsets(packed.vert_counts)) / packed.vert_counts[:, None]
+
+#Splits packed arrays into runs of size pieces. The runs are views of the arrays, nothing is copied
+def packed_chunks(packed, size):
+    vert_ends = np.concatenate([[0], np.cumsum(packed.vert_counts)]).tolist()
+    face_ends = np.concatenate([[0], np.cumsum(packed.face_counts)]).tolist()
+    loop_ends = np.concatenate([[0], np.cumsum(loop_counts(packed))]).tolist()
+    for start in range(0, len(packed.vert_counts), size):
+        stop = min(start + size, len(packed.vert_counts))
+        yield PackedPieces(packed.verts[vert_ends[start]:vert_ends[stop]], packed.loops[loop_ends[start]:loop_ends[stop]],
+            packed.face_sizes[face_ends[start]:face_ends[stop]], packed.vert_counts[start:stop], packed.face_counts[start:stop],
+            packed.materials[face_ends[start]:face_ends[stop]], packed.uvs[loop_ends[start]:loop_ends[stop]])
+
+#Packed arrays of some of the pieces, in the order given
+def take_pieces(packed, indices):
+    indices = np.asarray(indices, dtype=np.int64)
+    piece_loops = loop_counts(packed)
+
+    def gather(counts, starts):
+        counts = counts[indices]
+        return np.repeat(starts[indices] - offsets(counts), counts) + np.arange(int(counts.sum()))
+
+    face_rows = gather(packed.face_counts, offsets(packed.face_counts))
+    loop_rows = gather(piece_loops, offsets(piece_loops))
+    return PackedPieces(
+        packed.verts[gather(packed.vert_counts, offsets(packed.vert_counts))],
+        packed.loops[loop_rows],
+        packed.face_sizes[face_rows],
+        packed.vert_counts[indices],
+        packed.face_counts[indices],
+        packed.materials[face_rows],
+        packed.uvs[loop_rows])
+
+#Groups pieces that have the same faces, materials and UVs and the same vertices relative to their origin once rounded
+#to tolerance. extra is a number for every piece that has to match as well. Returns the first piece of every group and the group of every piece
+def shape_groups(packed, tolerance, extra=None):
+    count = len(packed.vert_counts)
+    origins = packed_origins(packed)
+    local = np.round((packed.verts - np.repeat(origins, packed.vert_counts, axis=0)) / tolerance).astype(np.int64)
+    extra = np.zeros(count, dtype=np.int64) if extra is None else np.round(np.asarray(extra) / tolerance).astype(np.int64)
+    vert_ends = np.concatenate([[0], np.cumsum(packed.vert_counts)]).tolist()
+    face_ends = np.concatenate([[0], np.cumsum(packed.face_counts)]).tolist()
+    loop_ends = np.concatenate([[0], np.cumsum(loop_counts(packed))]).tolist()
+    keys = {}
+    first = []
+    groups = np.empty(count, dtype=np.int64)
+    for i, value in enumerate(extra.tolist()):
+        key = (value, packed.face_sizes[face_ends[i]:face_ends[i + 1]].tobytes(),
+            packed.loops[loop_ends[i]:loop_ends[i + 1]].tobytes(), local[vert_ends[i]:vert_ends[i + 1]].tobytes(),
+            packed.materials[face_ends[i]:face_ends[i + 1]].tobytes(), packed.uvs[loop_ends[i]:loop_ends[i + 1]].tobytes())
+        group = keys.setdefault(key, len(keys))
+        if group == len(first):
+            first.append(i)
+        groups[i] = group
+    return np.array(first, dtype=np.int64), groups
+
+#Splits packed arrays back into pieces
+def unpack_pieces(packed):
+    pieces = []
+    vert_start = 0
+    face_start = 0
+    loop_start = 0
+    for vert_count, face_count in zip(packed.vert_counts.tolist(), packed.face_counts.tolist()):
+        faces = []
+        first_loop = loop_start
+        for size in packed.face_sizes[face_start:face_start + face_count].tolist():
+            faces.append(tuple(packed.loops[loop_start:loop_start + size].tolist()))
+            loop_start += size
+        pieces.append(Piece(packed.verts[vert_start:vert_start + vert_count], faces, None, None,
+            packed.materials[face_start:face_start + face_count], packed.uvs[first_loop:loop_start]))
+        vert_start += vert_count
+        face_start += face_count
+    return pieces
+
+#Packed arrays and stream keys of a list of pieces, empty pieces are left out like pack_pieces does
+def pack_with_keys(pieces):
+    pieces = [piece for piece in pieces if len(piece.verts) and piece.faces]
+    keys = np.array([piece.stream.key if piece.stream is not None else random_key() for piece in pieces], dtype=np.uint64)
+    return pack_pieces(pieces), keys
+
+#Pieces from packed arrays and stream keys
+def unpack_with_keys(packed, keys):
+    pieces = unpack_pieces(packed)
+    for piece, key in zip(pieces, keys.tolist()):
+        piece.stream = Stream(key)
+    return pieces
@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+
+#Planes drawn and checked together when looking for cuts at any angle
+PLANE_BATCH = 8
+
+#Batches drawn for every cut before giving up on the cuts still missing
+PLANE_TRIES = 4
+
+#The smaller side of a cut must be at least this part of the piece's depth along the plane normal
+MIN_SLIVER = 0.02
+
+#Same as the bisect distance, vertices closer to a plane than this are on it
+PLANE_DIST = 0.0001
+
+#rng is anything with the uniform and randint methods of the random module, such as a piece's Stream
+
+
+#Returns a rendom number within range
+def random_num(dim, rng=random):
+    return rng.uniform(-dim,dim)
+
+#Returns a vector that respects the objects center and dimensions
+def random_vector(object_center, dim, rng=random):
+    return (random_num(dim[0], rng) + object_center[0],random_num(dim[1], rng) + object_center[1],random_num(dim[2], rng) + object_center[2])
+
+#picks a random axis to cut on
+def pick_axis(axes, rng=random):
+    num = rng.randint(0,len(axes) - 1)
+    if num == 0:#x
+        return axes[0]
+    elif num == 1:#y
+        return axes[1]
+    else:#z
+        return axes[2]
+
+#get dimension - 10 percent to cut each piece
+#used in random_num and rand_vector to give random cut values within dimensions of current object
+def cut_range(dimensions):
+    return [(value / 2) - ((value / 2) * .1) for value in dimensions]
+
+#Creates a cut only at 90 degree angles, returned as (plane_co, plane_no)
+def cube_plane(axes, location, dim, rng=random):
+    axis = pick_axis(axes, rng)#Get a random axis to cut along
+    if axis == "x":
+        return (location[0],random_num(dim[1], rng) + location[1],0), (0, 1, 0)
+    elif axis == "y":
+        return (random_num(dim[0], rng) + location[0],location[1],0), (1, 0, 0)
+    return (location[0],location[1],random_num(dim[2], rng) + location[2]), (0, 0, 1)
+
+#Creates a cut at any angle, returned as (plane_co, plane_no)
+def ngon_plane(location, dim, rng=random):
+    return random_vector(location,dim, rng), random_vector((0,0,0), dim, rng)
+
+#Which planes cut verts into two sides that are both thicker than min_sliver of the depth of verts along the plane normal.
+#Worked out for every plane at once from the signed distance of every vertex
+def planes_split(verts, plane_cos, plane_nos, min_sliver=MIN_SLIVER):
+    plane_cos = np.asarray(plane_cos, dtype=np.float64).reshape(-1, 3)
+    plane_nos = np.asarray(plane_nos, dtype=np.float64).reshape(-1, 3)
+    length = np.linalg.norm(plane_nos, axis=1)
+    normals = plane_nos / np.where(length > 0, length, 1)[:, None]
+    if not len(verts):
+        return np.zeros(len(normals), dtype=bool)
+    dist = verts @ normals.T - np.einsum("ij,ij->i", plane_cos, normals)
+    above = dist.max(axis=0)
+    below = -dist.min(axis=0)
+    thinner = np.minimum(above, below)
+    return (length > 0) & (thinner > PLANE_DIST) & (thinner >= (above + below) * min_sliver)
+
+#Creates count cuts at any angle that split the piece's verts without leaving slivers, returned as (plane_co, plane_no).
+#Planes are drawn a batch at a time and the ones that miss or only shave the piece are dropped before anything is cut.
+#Fewer planes are returned when not enough are found
+def split_planes(verts, count, location, dim, rng=random):
+    planes = []
+    for batch in range(-(-count // PLANE_BATCH) * PLANE_TRIES):
+        if len(planes) >= count:
+            break
+        candidates = [ngon_plane(location, dim, rng) for i in range(PLANE_BATCH)]
+        split = planes_split(verts, [co for co, no in candidates], [no for co, no in candidates])
+        planes.extend(plane for plane, ok in zip(candidates, split.tolist()) if ok)
+    return planes[:count]
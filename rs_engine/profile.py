@@ -0,0 +1,88 @@
+#Cheap timing for each phase and recursion level of a run. Peak Python memory is recorded only when tracemalloc is tracing
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profile:
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.phases = {}
+        self.levels = {}
+
+    def phase_stats(self, name):
+        if name not in self.phases:
+            self.phases[name] = {"time": 0.0, "calls": 0, "pieces": 0, "verts": 0}
+        return self.phases[name]
+
+    def level_stats(self, level):
+        if level not in self.levels:
+            self.levels[level] = {"time": 0.0, "calls": 0, "pieces_in": 0, "pieces_out": 0, "verts_out": 0}
+        return self.levels[level]
+
+    #Times the code inside the with block and adds it to the phase
+    @contextmanager
+    def phase(self, name):
+        stats = self.phase_stats(name)
+        tracing = tracemalloc.is_tracing()
+        if tracing and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats["time"] += time.perf_counter() - start
+            stats["calls"] += 1
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                stats["peak_memory"] = max(stats.get("peak_memory", 0), peak)
+
+    #Adds piece and vertex counts to a phase
+    def count(self, name, pieces=0, verts=0):
+        stats = self.phase_stats(name)
+        stats["pieces"] += pieces
+        stats["verts"] += verts
+
+    #Adds one cut on a recursion level
+    def add_level(self, level, seconds, pieces_in, pieces_out, verts_out):
+        stats = self.level_stats(level)
+        stats["time"] += seconds
+        stats["calls"] += 1
+        stats["pieces_in"] += pieces_in
+        stats["pieces_out"] += pieces_out
+        stats["verts_out"] += verts_out
+
+    #Adds the phase and level stats of a profile made somewhere else, such as in a worker process
+    def merge(self, phases, levels):
+        for name, stats in phases.items():
+            total = self.phase_stats(name)
+            for key, value in stats.items():
+                total[key] = max(total.get(key, 0), value) if key == "peak_memory" else total[key] + value
+        for level, stats in levels.items():
+            total = self.level_stats(level)
+            for key, value in stats.items():
+                total[key] += value
+
+    def total_time(self):
+        return time.perf_counter() - self.start_time
+
+    def as_dict(self):
+        return {
+            "total_time": self.total_time(),
+            "phases": self.phases,
+            "levels": {str(level): stats for level, stats in sorted(self.levels.items())},
+        }
+
+    #One line for the operator report
+    def summary(self):
+        phases = ["%s %.2fs" % (name, stats["time"]) for name, stats in self.phases.items()]
+        if self.levels:
+            cut_time = sum(stats["time"] for stats in self.levels.values())
+            phases.append("cutting %d levels %.2fs" % (len(self.levels), cut_time))
+        return "%.2fs total (%s)" % (self.total_time(), ", ".join(phases))
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
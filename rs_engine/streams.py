@@ -0,0 +1,75 @@
+#Random streams for reproducible cutting. Every piece has a 64 bit key, its children get keys made from the parent key
+#and their index, and every number drawn is a hash of the key and a counter. The same seed gives the same pieces no matter
+#what order pieces are cut in or which process cuts them. The scalar and array versions give the same numbers.
+
+import random
+import zlib
+
+import numpy as np
+
+MASK = (1 << 64) - 1
+GOLDEN = 0x9E3779B97F4A7C15
+
+
+#splitmix64 finaliser
+def mix(x):
+    z = (x + GOLDEN) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+def mix_array(x):
+    with np.errstate(over="ignore"):
+        z = np.asarray(x, dtype=np.uint64) + np.uint64(GOLDEN)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+def seed_key(seed):
+    return mix(seed & MASK)
+
+#Key for a run when no seed is set
+def random_key():
+    return seed_key(random.getrandbits(64))
+
+#Key of a stream kept apart from the cutting streams, such as the Solidify thickness
+def named_key(seed, name):
+    return child_key(seed_key(seed), zlib.crc32(name.encode()))
+
+def child_key(key, index):
+    return mix(key ^ mix(index + 1))
+
+def child_keys(keys, indices):
+    return mix_array(np.asarray(keys, dtype=np.uint64) ^ mix_array(np.asarray(indices, dtype=np.uint64) + np.uint64(1)))
+
+#Number in [0, 1) drawn from a key
+def draw(key, counter):
+    return (mix(key ^ mix(counter)) >> 11) * (1.0 / (1 << 53))
+
+#Numbers in [0, 1) drawn from an array of keys
+def draws(keys, counter):
+    values = mix_array(np.asarray(keys, dtype=np.uint64) ^ np.uint64(mix(counter)))
+    return (values >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+#Stream of numbers for one piece. Has the uniform and randint methods used from the random module
+class Stream:
+    __slots__ = ("key", "counter")
+
+    def __init__(self, key):
+        self.key = key
+        self.counter = 0
+
+    def random(self):
+        value = draw(self.key, self.counter)
+        self.counter += 1
+        return value
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+    def randint(self, a, b):
+        return a + min(int(self.random() * (b - a + 1)), b - a)
+
+    def child(self, index):
+        return Stream(child_key(self.key, index))
@@ -0,0 +1,428 @@
+#Voronoi engine. Seed points are scattered over the surface and every face is clipped against the cells of the seeds
+#near it in one pass, so the piece count is about the seed count and no piece is cut twice.
+#A cell is the part of space closer to its seed than to any other seed. Clipping a polygon to a cell only needs the
+#seeds closer than twice the polygon's furthest vertex from the cell's seed, which a grid of the seeds finds quickly.
+
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+from .pieces import PackedPieces, empty_packed, face_arrays, offsets
+from .streams import child_keys, draws, random_key
+
+#Most pairs of faces and cells clipped in one step
+BATCH_PAIRS = 20000
+
+#Nearest seeds kept for every seed, seeds further away are only looked at for the few polygons that need them
+NEIGHBOURS = 64
+
+#Grid cells are this many times the average seed spacing
+GRID_SPACING = 4
+
+#Vertices of one piece closer than this part of the object size are merged
+WELD = 1e-7
+
+
+#Points spread evenly over the faces of a piece, drawn from the streams of key's children
+def surface_seeds(piece, count, key):
+    loops, sizes = face_arrays(piece)
+    starts = offsets(sizes)
+    #Faces are split into fans of triangles
+    tri_face = np.repeat(np.arange(len(sizes)), np.maximum(sizes - 2, 0))
+    tri_corner = np.arange(len(tri_face)) - np.repeat(offsets(np.maximum(sizes - 2, 0)), np.maximum(sizes - 2, 0)) + 1
+    a = piece.verts[loops[starts[tri_face]]]
+    b = piece.verts[loops[starts[tri_face] + tri_corner]]
+    c = piece.verts[loops[starts[tri_face] + tri_corner + 1]]
+    areas = np.linalg.norm(np.cross(b - a, c - a), axis=1) / 2
+    total = np.cumsum(areas)
+    keys = child_keys(np.full(count, key, dtype=np.uint64), np.arange(count))
+    tri = np.minimum(np.searchsorted(total, draws(keys, 0) * total[-1], side="right"), len(areas) - 1)
+    u = np.sqrt(draws(keys, 1))[:, None]
+    v = draws(keys, 2)[:, None]
+    return (1 - u) * a[tri] + u * (1 - v) * b[tri] + u * v * c[tri], float(total[-1])
+
+#Seeds binned in a grid of cubes cell_size wide
+class SeedGrid:
+    def __init__(self, seeds, cell_size):
+        self.seeds = seeds
+        self.cell_size = cell_size
+        self.low = seeds.min(axis=0)
+        self.coords = np.floor((seeds - self.low) / cell_size).astype(np.int64)
+        #One spare cell on every side so neighbouring cells never wrap around
+        self.shape = self.coords.max(axis=0) + 3
+        cell_keys = self.encode(self.coords)
+        self.order = np.argsort(cell_keys, kind="stable")
+        self.keys, self.starts, self.counts = np.unique(cell_keys[self.order], return_index=True, return_counts=True)
+
+    def encode(self, coords):
+        coords = coords + 1
+        return (coords[:, 0] * self.shape[1] + coords[:, 1]) * self.shape[2] + coords[:, 2]
+
+    #Seeds in the grid cells overlapping a box
+    def near(self, low, high):
+        first = np.clip(np.floor((low - self.low) / self.cell_size).astype(np.int64), -1, self.shape - 3)
+        last = np.clip(np.floor((high - self.low) / self.cell_size).astype(np.int64), -1, self.shape - 3)
+        grid = np.mgrid[first[0]:last[0] + 1, first[1]:last[1] + 1, first[2]:last[2] + 1].reshape(3, -1).T
+        cell_keys = self.encode(grid)
+        pos = np.minimum(np.searchsorted(self.keys, cell_keys), len(self.keys) - 1)
+        pos = pos[self.keys[pos] == cell_keys]
+        if not len(pos):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[self.starts[p]:self.starts[p] + self.counts[p]] for p in pos.tolist()])
+
+    #The nearest seeds of every seed sorted by distance, as (indices, distances, radius). Rows are padded with -1 and inf.
+    #Every seed closer than radius is in the row
+    def neighbours(self, limit):
+        count = len(self.seeds)
+        query = []
+        found = []
+        for offset in np.mgrid[-1:2, -1:2, -1:2].reshape(3, -1).T:
+            cell_keys = self.encode(self.coords + offset)
+            pos = np.minimum(np.searchsorted(self.keys, cell_keys), len(self.keys) - 1)
+            hit = self.keys[pos] == cell_keys
+            sizes = self.counts[pos[hit]]
+            first = np.repeat(self.starts[pos[hit]], sizes)
+            query.append(np.repeat(np.flatnonzero(hit), sizes))
+            found.append(self.order[first + np.arange(len(first)) - np.repeat(offsets(sizes), sizes)])
+        query = np.concatenate(query)
+        found = np.concatenate(found)
+        keep = query != found
+        query = query[keep]
+        found = found[keep]
+        dist = np.linalg.norm(self.seeds[query] - self.seeds[found], axis=1)
+        order = np.lexsort((dist, query))
+        query = query[order]
+        found = found[order]
+        dist = dist[order]
+        totals = np.bincount(query, minlength=count)
+        rank = np.arange(len(query)) - np.repeat(offsets(totals), totals)
+        #Every seed within one cell of a seed is in its 3x3x3 block of cells
+        radius = np.full(count, self.cell_size)
+        over = rank == limit
+        radius[query[over]] = np.minimum(radius[query[over]], dist[over])
+        kept = rank < limit
+        indices = np.full((count, limit), -1, dtype=np.int64)
+        distances = np.full((count, limit), np.inf)
+        indices[query[kept], rank[kept]] = found[kept]
+        distances[query[kept], rank[kept]] = dist[kept]
+        return indices, distances, radius
+
+#Clips padded polygons to the inside of a plane through point facing along normal, one plane per polygon.
+#Returns the new polygons and their vertex counts
+def clip_plane(polys, counts, point, normal):
+    rows, slots = polys.shape[:2]
+    index = np.arange(slots)
+    valid = index < counts[:, None]
+    dist = np.einsum("ijk,ik->ij", polys - point[:, None], normal)
+    inside = (dist <= 0) & valid
+    following = np.where(index + 1 < counts[:, None], index + 1, 0)
+    dist_next = np.take_along_axis(dist, following, 1)
+    cross = valid & (inside != np.take_along_axis(inside, following, 1))
+    out = inside.astype(np.int64) + cross
+    new_counts = out.sum(axis=1)
+    start = np.cumsum(out, axis=1) - out
+    new = np.zeros((rows, max(int(new_counts.max()), 1) if rows else 1, 3))
+    row = np.broadcast_to(np.arange(rows)[:, None], (rows, slots))
+    new[row[inside], start[inside]] = polys[inside]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = dist / (dist - dist_next)
+        ends = np.take_along_axis(polys, following[:, :, None], 1)
+        points = polys + (ends - polys) * t[:, :, None]
+    new[row[cross], (start + inside)[cross]] = points[cross]
+    return new, new_counts
+
+#Furthest vertex of every padded polygon from its cell's seed
+def polygon_radius(polys, counts, centers):
+    valid = np.arange(polys.shape[1]) < counts[:, None]
+    dist = np.linalg.norm(polys - centers[:, None], axis=2)
+    return np.where(valid, dist, 0).max(axis=1) if polys.shape[1] else np.zeros(len(counts))
+
+#Area of every padded polygon, worked out with Newell's method like face_normals
+def polygon_areas(polys, counts):
+    index = np.arange(polys.shape[1])
+    valid = index < counts[:, None]
+    following = np.where(index + 1 < counts[:, None], index + 1, 0)
+    ends = np.take_along_axis(polys, following[:, :, None], 1)
+    cross = np.where(valid[:, :, None], np.cross(polys, ends), 0)
+    return np.linalg.norm(cross.sum(axis=1), axis=1) / 2
+
+#Clips every polygon to the cell of its seed. candidates and distances are the nearest seeds of each row sorted by
+#distance, rows gives the row of every polygon. Returns the polygons, counts and whether each polygon may still be
+#cut by a seed that was not a candidate
+def clip_cells(polys, counts, cells, seeds, candidates, distances, radius, rows):
+    radius_now = polygon_radius(polys, counts, seeds[cells])
+    for k in range(candidates.shape[1]):
+        other = candidates[rows, k]
+        active = np.flatnonzero((counts >= 3) & (other >= 0) & (distances[rows, k] < radius_now * 2))
+        if not len(active):
+            break
+        center = seeds[cells[active]]
+        neighbour = seeds[other[active]]
+        clipped, clipped_counts = clip_plane(polys[active], counts[active], (center + neighbour) / 2, neighbour - center)
+        if clipped.shape[1] > polys.shape[1]:
+            polys = np.concatenate([polys, np.zeros((len(polys), clipped.shape[1] - polys.shape[1], 3))], axis=1)
+        polys[active] = 0
+        polys[active, :clipped.shape[1]] = clipped
+        counts[active] = clipped_counts
+        radius_now[active] = polygon_radius(clipped, clipped_counts, center)
+    unsure = (counts >= 3) & (radius_now * 2 > radius[rows])
+    return polys, counts, unsure
+
+#Faces as padded polygons
+def padded_faces(piece):
+    loops, sizes = face_arrays(piece)
+    polys = np.zeros((len(sizes), int(sizes.max()) if len(sizes) else 1, 3))
+    slot = np.arange(len(loops)) - np.repeat(offsets(sizes), sizes)
+    polys[np.repeat(np.arange(len(sizes)), sizes), slot] = piece.verts[loops]
+    return polys, sizes
+
+#The (F, 4, K) affine map from a point to its UVs that best fits the loops of every face, so clipped polygons get UVs
+#that match the face they were cut from
+def uv_fits(piece, polys, sizes):
+    columns = piece.uvs.shape[1]
+    if not columns:
+        return np.zeros((len(sizes), 4, 0))
+    valid = np.arange(polys.shape[1]) < sizes[:, None]
+    points = np.concatenate([polys, valid[:, :, None].astype(np.float64)], axis=2)
+    uvs = np.zeros((len(sizes), polys.shape[1], columns))
+    uvs[valid] = piece.uvs
+    return np.linalg.pinv(points) @ uvs
+
+
+#Same interface as FractureJob. Scatters count seeds over the piece and clips its faces to their cells a batch at a time.
+#Faces whose clipped parts don't add up to the face are clipped again against seeds further away, so no part of the
+#surface is lost. When the job stops early the faces not clipped yet are kept as one more piece
+class VoronoiJob:
+    def __init__(self, piece, count, key=None, max_pieces=0, max_time=0, profile=None):
+        self.piece = piece
+        self.count = count
+        self.key = random_key() if key is None else key
+        self.max_pieces = max_pieces
+        self.max_time = max_time
+        self.profile = profile
+        self.kept_levels = None
+        self.level = 0
+        self.done = False
+        self.stopped = None
+        self.start_time = None
+        self.queue = None
+        self.parts = []
+        self.pieces_done = 0
+        self.result = None
+        self.polys, self.sizes = padded_faces(piece)
+        self.fits = uv_fits(piece, self.polys, self.sizes)
+        dims = piece.verts.max(axis=0) - piece.verts.min(axis=0) if len(piece.verts) else np.zeros(3)
+        self.size = float(np.linalg.norm(dims)) or 1.0
+        if max_pieces and count > max_pieces:
+            self.count = max_pieces
+            self.stopped = "piece limit of %d reached" % max_pieces
+
+    @property
+    def pieces_remaining(self):
+        return len(self.piece.faces) if self.queue is None else len(self.queue)
+
+    @property
+    def piece_count(self):
+        if self.result is not None:
+            return len(self.result.vert_counts)
+        return self.count
+
+    def progress(self):
+        if self.done:
+            return 1.0
+        if self.queue is None or not len(self.piece.faces):
+            return 0.0
+        return 1 - len(self.queue) / len(self.piece.faces)
+
+    def phase(self, name):
+        if self.profile is None:
+            return nullcontext()
+        return self.profile.phase(name)
+
+    #Seeds, their neighbours and the faces to clip
+    def setup(self):
+        with self.phase("seeds"):
+            self.seeds, area = surface_seeds(self.piece, self.count, self.key)
+        with self.phase("neighbours"):
+            spacing = np.sqrt(area / self.count) if area > 0 else self.size / self.count
+            self.grid = SeedGrid(self.seeds, spacing * GRID_SPACING)
+            self.candidates, self.distances, self.radius = self.grid.neighbours(min(NEIGHBOURS, self.count - 1))
+        valid = (np.arange(self.polys.shape[1]) < self.sizes[:, None])[:, :, None]
+        self.face_low = np.where(valid, self.polys, np.inf).min(axis=1)
+        self.face_high = np.where(valid, self.polys, -np.inf).max(axis=1)
+        self.face_areas = polygon_areas(self.polys, self.sizes)
+        #(face, margin) of every face still to clip, the margin is how far past the face seeds are looked for
+        self.queue = [(face, self.grid.cell_size) for face in range(len(self.sizes))]
+        self.queue.reverse()
+
+    #Pairs of faces and the seeds near them for the next batch of faces
+    def next_batch(self):
+        faces = []
+        margins = []
+        pair_faces = []
+        pair_cells = []
+        total = 0
+        while self.queue and total < BATCH_PAIRS:
+            face, margin = self.queue.pop()
+            cells = self.grid.near(self.face_low[face] - margin, self.face_high[face] + margin)
+            faces.append(face)
+            margins.append(margin)
+            pair_faces.append(np.full(len(cells), face))
+            pair_cells.append(cells)
+            total += len(cells)
+        return faces, margins, np.concatenate(pair_faces), np.concatenate(pair_cells)
+
+    #Clips one batch of faces. Faces that lost area are put back with a wider margin
+    def clip_batch(self):
+        faces, margins, pair_faces, pair_cells = self.next_batch()
+        with self.phase("clip"):
+            polys = self.polys[pair_faces].copy()
+            counts = self.sizes[pair_faces].copy()
+            polys, counts, unsure = clip_cells(polys, counts, pair_cells, self.seeds, self.candidates, self.distances, self.radius, pair_cells)
+            #The few polygons near seeds that are not among the nearest are clipped against every seed close enough
+            for cell in np.unique(pair_cells[unsure]).tolist():
+                rows = np.flatnonzero(unsure & (pair_cells == cell))
+                dist = np.linalg.norm(self.seeds - self.seeds[cell], axis=1)
+                reach = polygon_radius(polys[rows], counts[rows], self.seeds[pair_cells[rows]]).max() * 2
+                order = np.flatnonzero(dist < reach)
+                order = order[np.argsort(dist[order], kind="stable")]
+                order = order[order != cell]
+                polys_cell, counts_cell, still = clip_cells(polys[rows], counts[rows], pair_cells[rows], self.seeds,
+                    order[None], dist[order][None], np.full(1, np.inf), np.zeros(len(rows), dtype=np.int64))
+                if polys_cell.shape[1] > polys.shape[1]:
+                    polys = np.concatenate([polys, np.zeros((len(polys), polys_cell.shape[1] - polys.shape[1], 3))], axis=1)
+                polys[rows] = 0
+                polys[rows, :polys_cell.shape[1]] = polys_cell
+                counts[rows] = counts_cell
+
+        #Parts of a face must add up to the face, if they don't some cells were not near enough to be found
+        areas = np.where(counts >= 3, polygon_areas(polys, counts), 0)
+        clipped = np.bincount(pair_faces, weights=areas, minlength=len(self.sizes))
+        redo = set()
+        for face, margin in zip(faces, margins):
+            if clipped[face] < self.face_areas[face] * (1 - 1e-6) - 1e-12 and margin < self.size:
+                self.queue.append((face, margin * 2))
+                redo.add(face)
+        keep = (counts >= 3) & (areas > (self.size * WELD) ** 2)
+        if redo:
+            keep &= ~np.isin(pair_faces, list(redo))
+        self.parts.append((pair_cells[keep], pair_faces[keep], polys[keep], counts[keep]))
+        self.pieces_done += len(faces) - len(redo)
+
+    #Cuts until the time budget in seconds runs out, None runs until finished. Returns True when the job is done
+    def step(self, budget=None):
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        if self.done:
+            return True
+        if self.queue is None:
+            if self.count < 1 or not len(self.piece.faces):
+                self.result = empty_packed(self.piece.uvs.shape[1])
+                self.done = True
+                return True
+            self.setup()
+        end = None if budget is None else time.perf_counter() + budget
+        while self.queue:
+            if self.max_time and time.perf_counter() - self.start_time >= self.max_time:
+                self.stopped = "time limit of %g seconds reached" % self.max_time
+                break
+            self.clip_batch()
+            if end is not None and time.perf_counter() >= end and self.queue:
+                return False
+        self.finish()
+        return True
+
+    def run(self):
+        while not self.step():
+            pass
+        return self
+
+    #A job that is already done keeps its result
+    def cancel(self):
+        if self.done:
+            return
+        self.stopped = "cancelled"
+        if self.queue is None:
+            self.queue = [(face, 0) for face in range(len(self.piece.faces))]
+        self.finish()
+
+    #Joins the clipped polygons of every cell into pieces, welding the vertices they share
+    def finish(self):
+        with self.phase("assemble"):
+            #Faces not clipped yet become one more piece
+            if self.queue:
+                rest = np.array(sorted(face for face, margin in self.queue), dtype=np.int64)
+                self.parts.append((np.full(len(rest), self.count), rest, self.polys[rest], self.sizes[rest]))
+            self.queue = []
+            self.result = assemble_cells(self.parts, self.size * WELD, self.piece.materials, self.fits)
+            self.parts = []
+        self.done = True
+
+    def packed(self):
+        return self.result if self.result is not None else empty_packed(self.piece.uvs.shape[1])
+
+    #Cells are only put together at the end, so they are never handed over while cutting and packed() has them all
+    def stream_to(self, output, size):
+        pass
+
+    #Drops the seeds, their neighbours and the result once it is packed
+    def release(self):
+        self.polys = self.sizes = self.fits = self.seeds = self.grid = self.candidates = self.distances = self.radius = None
+        self.face_low = self.face_high = self.face_areas = None
+        self.result = empty_packed()
+
+
+#Builds packed pieces from clipped polygons, one piece per cell. Vertices of a cell at the same place are merged.
+#Polygons take the material of their face and UVs from its fit
+def assemble_cells(parts, weld, materials, fits):
+    parts = [part for part in parts if len(part[0])]
+    if not parts:
+        return empty_packed(fits.shape[2])
+    width = max(part[2].shape[1] for part in parts)
+    cells = np.concatenate([part[0] for part in parts])
+    faces = np.concatenate([part[1] for part in parts])
+    polys = np.concatenate([np.pad(part[2], ((0, 0), (0, width - part[2].shape[1]), (0, 0))) for part in parts])
+    counts = np.concatenate([part[3] for part in parts])
+    order = np.lexsort((faces, cells))
+    cells = cells[order]
+    faces = faces[order]
+    polys = polys[order]
+    counts = counts[order]
+
+    valid = np.arange(width) < counts[:, None]
+    verts = polys[valid]
+    loop_fits = fits[np.repeat(faces, counts)]
+    uvs = np.einsum("lj,ljk->lk", np.concatenate([verts, np.ones((len(verts), 1))], axis=1), loop_fits)
+    vert_cells = np.repeat(cells, counts)
+    grid = np.round(verts / weld).astype(np.int64)
+    keys = np.concatenate([vert_cells[:, None], grid], axis=1)
+    unique, first, loops = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    loops = loops.ravel()
+
+    #Loops that repeat the one before them are dropped, then faces left with less than 3 loops
+    starts = offsets(counts)
+    previous = np.arange(len(loops)) - 1
+    previous[starts] = starts + counts - 1
+    keep = loops != loops[previous]
+    face_of_loop = np.repeat(np.arange(len(counts)), counts)
+    counts = np.bincount(face_of_loop[keep], minlength=len(counts))
+    loops = loops[keep]
+    uvs = uvs[keep]
+    face_keep = counts >= 3
+    loops = loops[np.repeat(face_keep, counts)]
+    uvs = uvs[np.repeat(face_keep, counts)]
+    counts = counts[face_keep]
+    cells = cells[face_keep]
+    faces = faces[face_keep]
+
+    #Only the vertices still used, numbered from the start of their cell
+    used, loops = np.unique(loops, return_inverse=True)
+    loops = loops.ravel()
+    used_cells = unique[used, 0]
+    verts = verts[first[used]]
+    piece_cells, vert_counts = np.unique(used_cells, return_counts=True)
+    face_counts = np.unique(cells, return_counts=True)[1]
+    loops = loops - np.repeat(np.repeat(offsets(vert_counts), face_counts), counts)
+    return PackedPieces(verts, loops.astype(np.int32), counts.astype(np.int32), vert_counts.astype(np.int32), face_counts.astype(np.int32),
+        materials[faces].astype(np.int32), uvs.astype(np.float32))
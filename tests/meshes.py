@@ -0,0 +1,42 @@
+#Meshes the tests cut, and the add-on folder on sys.path so rs_engine imports without Blender
+
+import os
+import sys
+
+import numpy as np
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ADDON_DIR not in sys.path:
+    sys.path.insert(0, ADDON_DIR)
+
+from rs_engine import Piece
+
+
+#Vertices and quads of a closed cube from -1 to 1
+def cube_arrays():
+    verts = np.array([(x, y, z) for z in (-1, 1) for y in (-1, 1) for x in (-1, 1)], dtype=np.float64)
+    faces = np.array([(0, 4, 6, 2), (1, 3, 7, 5), (0, 1, 5, 4), (2, 6, 7, 3), (0, 2, 3, 1), (4, 5, 7, 6)])
+    return verts, faces
+
+#Vertices and quads of a flat n by n grid from -1 to 1
+def grid_arrays(n):
+    coords = np.linspace(-1, 1, n + 1)
+    x, y = np.meshgrid(coords, coords)
+    verts = np.stack([x.ravel(), y.ravel(), np.zeros(x.size)], axis=1)
+    i, j = np.meshgrid(np.arange(n), np.arange(n))
+    first = (j * (n + 1) + i).ravel()
+    faces = np.stack([first, first + 1, first + n + 2, first + n + 1], axis=1)
+    return verts, faces
+
+def cube():
+    verts, faces = cube_arrays()
+    return Piece(verts, faces.tolist(), (0, 0, 0))
+
+def grid(n):
+    verts, faces = grid_arrays(n)
+    return Piece(verts, faces.tolist(), (0, 0, 0))
+
+#Every field of two sets of packed arrays is the same
+def assert_packed_equal(a, b):
+    for field, x, y in zip(a._fields, a, b):
+        assert np.array_equal(x, y), field
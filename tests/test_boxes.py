@@ -0,0 +1,54 @@
+#Tests of the box engine used for Make Only Cubes
+
+import numpy as np
+
+from meshes import assert_packed_equal, cube, grid
+from rs_engine import BoxFractureJob, CutSettings, boxes_from_piece, seed_key, split_faces
+
+
+AXES = ["x", "y", "z"]
+
+def box_job(source, axes, cuts=1, rec_cuts=0, keep_levels=False):
+    boxes = boxes_from_piece(source)
+    assert boxes is not None
+    settings = CutSettings(True, cuts, rec_cuts, 100, axes)
+    return BoxFractureJob(boxes[0], boxes[1], settings, source.center(), source.dimensions(), seed_key(1),
+        keep_levels=keep_levels, originals=boxes[2])
+
+
+#One cut through a closed cube leaves two open halves of five faces each
+def test_cube_whole():
+    packed = box_job(cube(), AXES).run().packed()
+    assert packed.vert_counts.tolist() == [8, 8]
+    assert packed.face_counts.tolist() == [5, 5]
+
+#With split faces the four faces the cut goes through become two pieces each
+def test_cube_split():
+    packed = box_job(split_faces(cube()), AXES).run().packed()
+    assert len(packed.vert_counts) == 10
+    assert len(packed.face_sizes) == 10
+    assert (packed.face_sizes == 4).all()
+
+#A cut along x goes through one row of the ten by ten grid
+def test_grid_split():
+    packed = box_job(split_faces(grid(10)), ["x"]).run().packed()
+    assert len(packed.vert_counts) == 110
+    assert len(packed.verts) == 440
+
+#A grid with shared vertices is not made of boxes, the NumPy cutter cuts it
+def test_grid_whole_is_not_boxes():
+    assert boxes_from_piece(grid(10)) is None
+
+#Cutting only cuts boxes apart, the faces still cover the same area
+def test_recursive_cuts_keep_area():
+    packed = box_job(split_faces(cube()), AXES, 3, 2).run().packed()
+    quads = packed.verts[packed.loops + np.repeat(np.repeat(np.cumsum(packed.vert_counts) - packed.vert_counts,
+        packed.face_counts), packed.face_sizes)].reshape(-1, 4, 3)
+    areas = np.linalg.norm(np.cross(quads[:, 1] - quads[:, 0], quads[:, 3] - quads[:, 0]), axis=1)
+    assert np.isclose(areas.sum(), 24)
+    assert len(packed.vert_counts) > 10
+
+#The same seed always gives the same boxes
+def test_same_seed_same_boxes():
+    assert_packed_equal(box_job(split_faces(cube()), AXES, 3, 2).run().packed(),
+        box_job(split_faces(cube()), AXES, 3, 2).run().packed())
@@ -0,0 +1,54 @@
+#Tests of the on-disk result cache
+
+import os
+
+from meshes import assert_packed_equal, cube, grid
+from rs_engine import ResultCache, cache_key, pack_pieces, split_islands
+
+
+def result(n):
+    return pack_pieces(split_islands(grid(n)))
+
+def test_put_get(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    packed = result(2)
+    cache.put("a", packed)
+    assert_packed_equal(cache.get("a"), packed)
+    assert cache.get("b") is None
+
+def test_key_changes_with_mesh_and_settings():
+    piece = cube()
+    key = cache_key(piece, (1, "x"))
+    assert key == cache_key(cube(), (1, "x"))
+    assert key != cache_key(piece, (2, "x"))
+    assert key != cache_key(grid(1), (1, "x"))
+    moved = cube()
+    moved.verts[0, 0] += 0.5
+    assert key != cache_key(moved, (1, "x"))
+    recoloured = cube()
+    recoloured.materials[0] = 1
+    assert key != cache_key(recoloured, (1, "x"))
+
+#Once the cache is too big the least recently used results go first, the one just saved always stays
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for i, name in enumerate("abc"):
+        cache.put(name, result(4))
+        os.utime(cache.path(name), (1000 + i, 1000 + i))
+    #Reading marks a result as used now
+    assert cache.get("a") is not None
+    size = os.path.getsize(cache.path("a"))
+    cache.max_bytes = size * 3
+    cache.put("d", result(4))
+    assert not os.path.exists(cache.path("b"))
+    assert all(os.path.exists(cache.path(name)) for name in "acd")
+
+    cache.max_bytes = 1
+    cache.put("e", result(4))
+    assert os.listdir(str(tmp_path)) == ["e.npz"]
+
+def test_unreadable_result_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    with open(cache.path("a"), "wb") as f:
+        f.write(b"not a result")
+    assert cache.get("a") is None
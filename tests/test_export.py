@@ -0,0 +1,128 @@
+#Tests that the exporters write well formed files holding every piece
+
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from meshes import cube, grid
+from rs_engine import Piece, open_writer, pack_pieces, packed_chunks, packed_origins, split_faces, split_islands
+
+
+#A cube, the faces of a grid and an ngon
+def pieces():
+    ngon = Piece([(np.cos(a), np.sin(a), 2) for a in np.linspace(0, 2 * np.pi, 6, endpoint=False)], [range(6)])
+    return pack_pieces([cube()] + split_islands(split_faces(grid(1))) + [ngon])
+
+#Writes the pieces a batch at a time, like Export Only does
+def export(export_format, path, packed, batch=2):
+    thickness = np.arange(len(packed.vert_counts)) * 0.1
+    with open_writer(export_format, str(path)) as writer:
+        start = 0
+        for chunk in packed_chunks(packed, batch):
+            writer.add(chunk, thickness[start:start + len(chunk.vert_counts)])
+            start += len(chunk.vert_counts)
+    return writer.path, thickness
+
+#Loops of every face numbered across every piece
+def world_loops(packed):
+    vert_starts = np.repeat(np.cumsum(packed.vert_counts) - packed.vert_counts, packed.face_counts)
+    return packed.loops + np.repeat(vert_starts, packed.face_sizes)
+
+
+def test_ply(tmp_path):
+    packed = pieces()
+    path, thickness = export("PLY", tmp_path / "pieces", packed)
+    assert path.endswith(".ply")
+    with open(path, "rb") as f:
+        data = f.read()
+    header, body = data.split(b"end_header\n", 1)
+    lines = header.decode("ascii").splitlines()
+    assert lines[:2] == ["ply", "format binary_little_endian 1.0"]
+    assert "element vertex %d" % len(packed.verts) in lines
+    assert "element face %d" % len(packed.face_sizes) in lines
+    assert "element piece %d" % len(packed.vert_counts) in lines
+
+    verts = np.frombuffer(body, dtype=[("co", "<f4", 3), ("piece", "<i4")], count=len(packed.verts))
+    assert np.allclose(verts["co"], packed.verts)
+    assert verts["piece"].tolist() == np.repeat(np.arange(len(packed.vert_counts)), packed.vert_counts).tolist()
+    face_bytes = (len(packed.face_sizes) + len(packed.loops)) * 4
+    faces = np.frombuffer(body, dtype="<i4", count=face_bytes // 4, offset=verts.nbytes)
+    starts = np.cumsum(packed.face_sizes + 1) - packed.face_sizes - 1
+    assert faces[starts].tolist() == packed.face_sizes.tolist()
+    assert np.delete(faces, starts).tolist() == world_loops(packed).tolist()
+    rows = np.frombuffer(body, dtype="<f4", offset=verts.nbytes + face_bytes).reshape(-1, 4)
+    assert np.allclose(rows[:, :3], packed_origins(packed))
+    assert np.allclose(rows[:, 3], thickness)
+
+def test_glb(tmp_path):
+    packed = pieces()
+    path, thickness = export("GLB", tmp_path / "pieces", packed)
+    assert path.endswith(".glb")
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, total = struct.unpack_from("<4sII", data)
+    assert (magic, version, total) == (b"glTF", 2, len(data))
+    json_length, kind = struct.unpack_from("<I4s", data, 12)
+    assert kind == b"JSON" and json_length % 4 == 0
+    document = json.loads(data[20:20 + json_length])
+    bin_length, kind = struct.unpack_from("<I4s", data, 20 + json_length)
+    assert kind == b"BIN\0" and bin_length % 4 == 0
+    buffer = data[28 + json_length:]
+    assert len(buffer) == bin_length >= document["buffers"][0]["byteLength"]
+
+    origins = packed_origins(packed)
+    vert_starts = np.cumsum(packed.vert_counts) - packed.vert_counts
+    assert len(document["nodes"]) == len(packed.vert_counts)
+    for i, node in enumerate(document["nodes"]):
+        #Y up: (x, y, z) is written as (x, z, -y)
+        x, y, z = origins[i]
+        assert np.allclose(node["translation"], (x, z, -y))
+        assert node["extras"]["thickness"] == pytest.approx(thickness[i])
+        primitive = document["meshes"][node["mesh"]]["primitives"][0]
+        position = document["accessors"][primitive["attributes"]["POSITION"]]
+        view = document["bufferViews"][position["bufferView"]]
+        local = np.frombuffer(buffer, dtype="<f4", count=position["count"] * 3, offset=view["byteOffset"]).reshape(-1, 3)
+        world = packed.verts[vert_starts[i]:vert_starts[i] + packed.vert_counts[i]] - origins[i]
+        assert np.allclose(local, np.stack([world[:, 0], world[:, 2], -world[:, 1]], axis=1), atol=1e-6)
+        assert np.allclose(position["min"], local.min(axis=0)) and np.allclose(position["max"], local.max(axis=0))
+        indices = document["accessors"][primitive["indices"]]
+        assert indices["count"] % 3 == 0
+        view = document["bufferViews"][indices["bufferView"]]
+        triangles = np.frombuffer(buffer, dtype="<u4", count=indices["count"], offset=view["byteOffset"])
+        assert triangles.max() < position["count"]
+    #Every face of n loops is n - 2 triangles
+    assert sum(document["accessors"][mesh["primitives"][0]["indices"]]["count"] for mesh in document["meshes"]) == \
+        3 * int((packed.face_sizes - 2).sum())
+
+def test_npy(tmp_path):
+    packed = pieces()
+    path, thickness = export("NPY", tmp_path / "pieces", packed)
+    for field, array in packed._asdict().items():
+        assert np.allclose(np.load("%s_%s.npy" % (path, field)), array), field
+    assert np.allclose(np.load(path + "_origins.npy"), packed_origins(packed))
+    assert np.allclose(np.load(path + "_thickness.npy"), thickness)
+
+#A writer that is thrown away leaves no file and no temporary files behind
+@pytest.mark.parametrize("export_format", ["PLY", "GLB", "NPY"])
+def test_discard(tmp_path, export_format):
+    packed = pieces()
+    writer = open_writer(export_format, str(tmp_path / "pieces"))
+    writer.add(packed, np.zeros(len(packed.vert_counts)))
+    writer.discard()
+    assert os.listdir(str(tmp_path)) == []
+
+#No pieces still makes a valid file
+@pytest.mark.parametrize("export_format", ["PLY", "GLB", "NPY"])
+def test_empty(tmp_path, export_format):
+    packed = pack_pieces([])
+    export(export_format, tmp_path / "pieces", packed)
+    if export_format == "NPY":
+        assert np.load(str(tmp_path / "pieces_verts.npy")).shape == (0, 3)
+    elif export_format == "GLB":
+        with open(str(tmp_path / "pieces.glb"), "rb") as f:
+            data = f.read()
+        assert struct.unpack_from("<4sII", data) == (b"glTF", 2, len(data))
+        assert json.loads(data[20:])["nodes"] == []
@@ -0,0 +1,46 @@
+#Tests that cutting in worker processes gives the same pieces as cutting in this one
+
+import pytest
+
+from meshes import assert_packed_equal, grid
+from rs_engine import CutSettings, FractureJob, ParallelFractureJob, Stream, island_chunks, make_planes, seed_key, slice_piece, split_faces
+import rs_engine.parallel
+
+
+#Chunks of a split grid with the first planes they share
+def grid_chunks(settings):
+    source = grid(6)
+    source.stream = Stream(seed_key(5))
+    first_planes = make_planes(source, settings, source.stream)
+    return island_chunks(split_faces(source), 30), first_planes
+
+def serial_packed(settings):
+    chunks, first_planes = grid_chunks(settings)
+    return FractureJob(chunks, settings, slice_piece, first_planes=first_planes).run().packed()
+
+
+#The same seed gives the same pieces cut in this process or with any number of workers
+@pytest.mark.parametrize("workers", [1, 3])
+def test_matches_serial(workers):
+    settings = CutSettings(False, 3, 2, 60, ["x", "y", "z"])
+    chunks, first_planes = grid_chunks(settings)
+    packed = ParallelFractureJob(chunks, settings, first_planes, workers).run().packed()
+    assert len(packed.vert_counts) > len(chunks)
+    assert_packed_equal(packed, serial_packed(settings))
+
+#Without shared memory, as on Python 3.7, every task is cut in this process
+def test_without_shared_memory(monkeypatch):
+    monkeypatch.setattr(rs_engine.parallel, "shared_memory", None)
+    monkeypatch.setattr(rs_engine.parallel, "start_pool", None)
+    settings = CutSettings(False, 3, 2, 60, ["x", "y", "z"])
+    chunks, first_planes = grid_chunks(settings)
+    packed = ParallelFractureJob(chunks, settings, first_planes, 3).run().packed()
+    assert_packed_equal(packed, serial_packed(settings))
+
+#Every task stops once it has made max_pieces pieces, so the job stops near the limit
+def test_piece_limit():
+    settings = CutSettings(False, 4, 4, 100, ["x", "y", "z"])
+    chunks, first_planes = grid_chunks(settings)
+    job = ParallelFractureJob(chunks, settings, first_planes, 1, max_pieces=200).run()
+    assert job.stopped == "piece limit of 200 reached"
+    assert len(job.packed().vert_counts) >= 200
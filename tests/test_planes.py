@@ -0,0 +1,34 @@
+#Tests of the checks that drop random cuts which would miss a piece or only shave a sliver off it
+
+import numpy as np
+
+from meshes import cube, cube_arrays
+from rs_engine import Stream, bisect_piece, planes_split, seed_key, split_planes
+
+
+VERTS = cube_arrays()[0]
+
+def test_planes_split():
+    cos = [(0, 0, 0), (0, 0, 5), (0.999, 0, 0), (1, 0, 0), (0, 0, 0), (0.5, 0.5, 0.5)]
+    nos = [(1, 0, 0), (0, 0, 1), (1, 0, 0), (1, 0, 0), (0, 0, 0), (1, 1, 1)]
+    #Through the middle, missing, a sliver, on a face, no normal, at an angle
+    assert planes_split(VERTS, cos, nos).tolist() == [True, False, False, False, False, True]
+
+def test_min_sliver():
+    assert planes_split(VERTS, [(0.9, 0, 0)], [(1, 0, 0)]).tolist() == [True]
+    assert planes_split(VERTS, [(0.9, 0, 0)], [(1, 0, 0)], 0.1).tolist() == [False]
+
+def test_no_verts():
+    assert planes_split(np.empty((0, 3)), [(0, 0, 0)], [(1, 0, 0)]).tolist() == [False]
+
+#Every plane found really cuts the cube in two
+def test_split_planes_cut():
+    planes = split_planes(VERTS, 20, (0, 0, 0), (1, 1, 1), Stream(seed_key(4)))
+    assert len(planes) == 20
+    for plane_co, plane_no in planes:
+        assert planes_split(VERTS, [plane_co], [plane_no]).tolist() == [True]
+        assert len(bisect_piece(cube(), plane_co, plane_no).verts) > 8
+
+#No planes are given when none can split the verts
+def test_split_planes_gives_up():
+    assert split_planes(VERTS[:1], 3, (0, 0, 0), (1, 1, 1), Stream(seed_key(4))) == []
@@ -0,0 +1,59 @@
+#Tests that Update Shapes gives the same pieces as cutting again from the start
+
+import pytest
+
+from meshes import assert_packed_equal, cube, grid
+from rs_engine import (BoxFractureJob, CutSettings, FractureJob, ParallelFractureJob, Stream, boxes_from_piece,
+    island_chunks, make_planes, seed_key, slice_piece, split_faces)
+
+
+AXES = ["x", "y", "z"]
+
+def grid_chunks(settings):
+    source = grid(6)
+    source.stream = Stream(seed_key(5))
+    first_planes = make_planes(source, settings, source.stream)
+    return island_chunks(split_faces(source), 30), first_planes
+
+def fracture_job(settings, parallel, keep_levels=True):
+    chunks, first_planes = grid_chunks(settings)
+    if parallel:
+        return ParallelFractureJob(chunks, settings, first_planes, 1, keep_levels=keep_levels)
+    return FractureJob(chunks, settings, slice_piece, first_planes=first_planes, keep_levels=keep_levels)
+
+def box_job(rec_cuts):
+    source = split_faces(cube())
+    boxes = boxes_from_piece(source)
+    return BoxFractureJob(boxes[0], boxes[1], CutSettings(True, 2, rec_cuts, 100, AXES), source.center(),
+        source.dimensions(), seed_key(1), keep_levels=True, originals=boxes[2])
+
+
+#Cutting the kept last level further gives the same pieces as cutting that deep in one run, even once the job
+#has released its pieces
+@pytest.mark.parametrize("parallel", [False, True])
+def test_deeper_matches_fresh(parallel):
+    settings = CutSettings(False, 3, 1, 100, AXES)
+    fresh = fracture_job(settings._replace(rec_cuts=3), parallel, False).run().packed()
+    job = fracture_job(settings, parallel).run()
+    job.release()
+    assert_packed_equal(job.resumed(3).run().packed(), fresh)
+
+#A kept level is the result of a run that stopped there
+def test_kept_level_matches_fresh():
+    settings = CutSettings(False, 3, 3, 100, AXES)
+    job = fracture_job(settings, False).run()
+    assert_packed_equal(job.packed_level(1), fracture_job(settings._replace(rec_cuts=1), False, False).run().packed())
+
+def test_boxes_deeper_matches_fresh():
+    job = box_job(1).run()
+    job.release()
+    assert_packed_equal(job.resumed(3).run().packed(), box_job(3).run().packed())
+    assert_packed_equal(job.packed_level(0), box_job(0).run().packed())
+
+#Released jobs hold no pieces, only their kept levels
+@pytest.mark.parametrize("parallel", [False, True])
+def test_release_drops_pieces(parallel):
+    job = fracture_job(CutSettings(False, 3, 1, 100, AXES), parallel).run()
+    job.release()
+    assert len(job.packed().vert_counts) == 0
+    assert job.packed_level(1) is not None
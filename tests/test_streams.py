@@ -0,0 +1,43 @@
+#Tests of the random streams every piece draws its cuts from
+
+import numpy as np
+
+from meshes import assert_packed_equal, grid
+from rs_engine import CutSettings, FractureJob, Stream, child_key, child_keys, make_planes, named_key, seed_key, slice_piece, split_faces
+from rs_engine.streams import draw, draws
+
+
+KEYS = [seed_key(seed) for seed in (0, 1, 2, 12345, 2 ** 40)]
+
+def test_draws_match_draw():
+    for counter in range(5):
+        assert draws(np.array(KEYS, dtype=np.uint64), counter).tolist() == [draw(key, counter) for key in KEYS]
+
+def test_child_keys_match_child_key():
+    indices = [0, 1, 7, 1000]
+    for key in KEYS:
+        assert child_keys(np.full(len(indices), key, dtype=np.uint64), indices).tolist() == [child_key(key, i) for i in indices]
+
+def test_stream_range():
+    stream = Stream(seed_key(3))
+    values = [stream.random() for i in range(1000)]
+    assert min(values) >= 0 and max(values) < 1
+    stream = Stream(seed_key(3))
+    assert sorted(set(stream.randint(2, 5) for i in range(200))) == [2, 3, 4, 5]
+
+#Named streams, children and seeds never give the same numbers
+def test_streams_are_independent():
+    keys = [seed_key(1), seed_key(2), named_key(1, "solidify"), child_key(seed_key(1), 0), child_key(seed_key(1), 1)]
+    assert len(set(keys)) == len(keys)
+    assert len(set(draw(key, 0) for key in keys)) == len(keys)
+
+def cut(seed):
+    source = grid(4)
+    source.stream = Stream(seed_key(seed))
+    settings = CutSettings(False, 2, 2, 100, ["x", "y", "z"])
+    first_planes = make_planes(source, settings, source.stream)
+    return FractureJob([split_faces(source)], settings, slice_piece, first_planes=first_planes).run().packed()
+
+def test_same_seed_same_pieces():
+    assert_packed_equal(cut(7), cut(7))
+    assert not np.array_equal(cut(7).verts, cut(8).verts)
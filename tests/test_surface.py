@@ -0,0 +1,133 @@
+#Tests that pieces keep the materials and UVs of the faces they were cut from
+
+import importlib
+import sys
+import types
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from meshes import ADDON_DIR, assert_packed_equal, cube_arrays, grid_arrays
+from rs_engine import (BoxFractureJob, CutSettings, FractureJob, Piece, Stream, VoronoiJob, boxes_from_piece,
+    island_chunks, make_planes, pack_pieces, seed_key, slice_piece, split_faces, split_islands, unpack_pieces)
+
+
+AXES = ["x", "y", "z"]
+
+#A flat grid with UVs taken from the vertex positions and a material for every column of faces
+def uv_grid(n):
+    verts, faces = grid_arrays(n)
+    uvs = verts[faces.ravel(), :2]
+    materials = np.arange(len(faces)) % n % 3
+    return Piece(verts, faces.tolist(), (0, 0, 0), None, materials, np.concatenate([uvs, uvs * 2], axis=1))
+
+#UVs of a grid piece must still be its vertex positions, wherever the cuts went
+def assert_uvs_follow_verts(packed):
+    for piece in unpack_pieces(packed):
+        loops = np.array([index for face in piece.faces for index in face], dtype=np.int64)
+        assert np.allclose(piece.uvs[:, :2], piece.verts[loops, :2], atol=1e-5)
+        assert np.allclose(piece.uvs[:, 2:], piece.verts[loops, :2] * 2, atol=1e-5)
+
+#Every face must have the material of the grid column its center is in
+def assert_materials_follow_columns(packed, n):
+    starts = np.cumsum(packed.face_sizes) - packed.face_sizes
+    vert_starts = np.repeat(np.cumsum(packed.vert_counts) - packed.vert_counts, packed.face_counts)
+    corners = packed.verts[packed.loops + np.repeat(vert_starts, packed.face_sizes)]
+    centers = np.add.reduceat(corners, starts) / packed.face_sizes[:, None]
+    columns = np.floor((centers[:, 0] + 1) * n / 2).astype(int)
+    assert (packed.materials == columns % 3).all()
+
+#Collection with foreach_get like bpy_prop_collection, values are given flat
+class StubCollection(list):
+    def __init__(self, count, **values):
+        super().__init__(range(count))
+        self.values = values
+
+    def foreach_get(self, name, out):
+        out[...] = np.asarray(self.values[name]).ravel()
+
+#Mesh object with the parts of the bpy API piece_from_object reads. The loops of the last polygon are stored first
+#so they have to be put back in polygon order
+def stub_object(verts, faces, uv_layers=()):
+    sizes = np.array([len(face) for face in faces])
+    starts = np.cumsum(sizes[::-1])[::-1] - sizes
+    stored = np.concatenate([np.arange(start, start + size) for start, size in zip(starts, sizes)])
+    order = np.argsort(stored)
+    loops = np.concatenate([list(face) for face in faces])[order]
+    layers = [SimpleNamespace(name=name, data=StubCollection(len(loops), uv=uvs[order])) for name, uvs in uv_layers]
+    mesh = SimpleNamespace(
+        vertices=StubCollection(len(verts), co=verts),
+        loops=StubCollection(len(loops), vertex_index=loops),
+        polygons=StubCollection(len(faces), loop_total=sizes, loop_start=starts, material_index=np.arange(len(faces)) % 2),
+        uv_layers=layers,
+        materials=[])
+    return SimpleNamespace(data=mesh, matrix_world=np.eye(4), location=(0, 0, 0))
+
+#The add-on's cutter module, imported without running the add-on's __init__.py which needs bpy
+@pytest.fixture(scope="module")
+def addon_cutter():
+    package = types.ModuleType("random_shapes_addon")
+    package.__path__ = [ADDON_DIR]
+    sys.modules[package.__name__] = package
+    try:
+        yield importlib.import_module(package.__name__ + ".cutter")
+    finally:
+        for name in [name for name in sys.modules if name.split(".")[0] == package.__name__]:
+            del sys.modules[name]
+
+
+#Meshes from from_pydata or PLY and STL files have no UV layers
+def test_read_mesh_without_uvs(addon_cutter):
+    verts, faces = cube_arrays()
+    piece = addon_cutter.piece_from_object(stub_object(verts, faces.tolist()))
+    assert piece.faces == [tuple(face) for face in faces.tolist()]
+    assert piece.uvs.shape == (24, 0)
+    assert piece.materials.tolist() == [0, 1, 0, 1, 0, 1]
+
+def test_read_mesh_with_uvs(addon_cutter):
+    verts, faces = grid_arrays(2)
+    uvs = verts[faces.ravel(), :2]
+    piece = addon_cutter.piece_from_object(stub_object(verts, faces.tolist(), [("UVMap", uvs), ("Second", uvs * 2)]))
+    assert piece.faces == [tuple(face) for face in faces.tolist()]
+    assert np.allclose(piece.uvs, np.concatenate([uvs, uvs * 2], axis=1))
+
+def test_split_islands_round_trip():
+    source = uv_grid(4)
+    pieces = split_islands(split_faces(source))
+    assert len(pieces) == 16
+    packed = pack_pieces(pieces)
+    assert np.array_equal(packed.materials, source.materials)
+    assert np.array_equal(packed.uvs, source.uvs)
+    assert_packed_equal(pack_pieces(unpack_pieces(packed)), packed)
+
+#A piece in one loose part comes back whole
+def test_split_islands_single_part():
+    source = uv_grid(3)
+    pieces = split_islands(source)
+    assert len(pieces) == 1
+    assert_packed_equal(pack_pieces(pieces), pack_pieces([source]))
+
+def test_cutter_keeps_materials_and_uvs():
+    source = uv_grid(6)
+    source.stream = Stream(seed_key(5))
+    settings = CutSettings(False, 3, 2, 100, AXES)
+    chunks = island_chunks(split_faces(source), 30)
+    packed = FractureJob(chunks, settings, slice_piece, first_planes=make_planes(source, settings, source.stream)).run().packed()
+    assert len(packed.vert_counts) > len(chunks)
+    assert_materials_follow_columns(packed, 6)
+    assert_uvs_follow_verts(packed)
+
+@pytest.mark.parametrize("split", [False, True])
+def test_boxes_keep_materials_and_uvs(split):
+    source = split_faces(uv_grid(10))
+    boxes = boxes_from_piece(source)
+    packed = BoxFractureJob(boxes[0], boxes[1], CutSettings(True, 3, 2, 100, ["x", "y"]), source.center(),
+        source.dimensions(), seed_key(1), originals=boxes[2]).run().packed()
+    assert_materials_follow_columns(packed, 10)
+    assert_uvs_follow_verts(packed)
+
+def test_voronoi_keeps_materials_and_uvs():
+    packed = VoronoiJob(uv_grid(8), 40, seed_key(1)).run().packed()
+    assert_materials_follow_columns(packed, 8)
+    assert_uvs_follow_verts(packed)
@@ -0,0 +1,51 @@
+#Tests of the Voronoi engine
+
+import numpy as np
+import pytest
+
+from meshes import assert_packed_equal, cube, grid
+from rs_engine import VoronoiJob, seed_key
+
+
+#Area of every face of packed pieces, faces are convex so fans of triangles cover them
+def face_areas(packed):
+    vert_starts = np.repeat(np.cumsum(packed.vert_counts) - packed.vert_counts, packed.face_counts)
+    loops = packed.loops + np.repeat(vert_starts, packed.face_sizes)
+    areas = []
+    start = 0
+    for size in packed.face_sizes.tolist():
+        corners = packed.verts[loops[start:start + size]]
+        areas.append(np.linalg.norm(np.cross(corners[1:-1] - corners[0], corners[2:] - corners[0]), axis=1).sum() / 2)
+        start += size
+    return np.array(areas)
+
+
+#Every seed makes one cell and the cells cover the whole surface
+@pytest.mark.parametrize("source, area", [(cube(), 24), (grid(10), 4)])
+@pytest.mark.parametrize("count", [10, 500])
+def test_cells_cover_surface(source, area, count):
+    packed = VoronoiJob(source, count, seed_key(2)).run().packed()
+    assert len(packed.vert_counts) == count
+    assert np.isclose(face_areas(packed).sum(), area)
+
+def test_same_seed_same_cells():
+    assert_packed_equal(VoronoiJob(cube(), 100, seed_key(2)).run().packed(), VoronoiJob(cube(), 100, seed_key(2)).run().packed())
+
+def test_piece_limit():
+    job = VoronoiJob(cube(), 100, seed_key(2), max_pieces=40).run()
+    assert job.stopped == "piece limit of 40 reached"
+    assert len(job.packed().vert_counts) == 40
+
+#Faces not clipped yet when the job is cancelled are kept as one more piece
+def test_cancel_keeps_surface():
+    job = VoronoiJob(grid(10), 50, seed_key(2))
+    job.cancel()
+    packed = job.packed()
+    assert len(packed.vert_counts) == 1
+    assert np.isclose(face_areas(packed).sum(), 4)
+
+def test_cancel_when_done_keeps_cells():
+    job = VoronoiJob(grid(10), 50, seed_key(2)).run()
+    job.cancel()
+    assert job.stopped is None
+    assert len(job.packed().vert_counts) == 50